@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .authentication import evict_token, evict_user_tokens
+        from .search import update_recipe_search_vector
+
+        post_save.connect(update_recipe_search_vector,
+                          sender='foodgram.Recipe')
+        post_save.connect(evict_user_tokens, sender='user.User')
+        post_delete.connect(evict_token, sender='authtoken.Token')
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .metrics import count_cache
+
+
+class TokenCache:
+    """token key -> (user, token) in the `alias` Django cache.
+
+    Entries expire `ttl` seconds after they are written. The cache must be
+    shared by all workers (see api.checks), so an eviction on logout,
+    password change or deactivation is seen by every worker right away.
+    The user is stored without its password hash, see
+    CachedTokenAuthentication.
+    """
+    key_prefix = 'auth-token:'
+
+    def __init__(self, ttl, alias):
+        self.ttl = ttl
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        entry = self.cache.get(self.key_prefix + key)
+        count_cache('auth_token', entry is not None)
+        return entry
+
+    def set(self, key, user, token):
+        self.cache.set(self.key_prefix + key, (user, token), self.ttl)
+
+    def evict(self, *keys):
+        self.cache.delete_many([self.key_prefix + key for key in keys])
+
+
+token_cache = TokenCache(settings.TOKEN_AUTH_CACHE_TTL,
+                         settings.TOKEN_AUTH_CACHE_ALIAS)
+
+
+def evict_user_tokens(sender, instance, **kwargs):
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True))
+    if keys:
+        token_cache.evict(*keys)
+
+
+def evict_token(sender, instance, **kwargs):
+    token_cache.evict(instance.key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is not None:
+            return entry
+
+        model = self.get_model()
+        try:
+            # The shared cache may be a directory on disk, so it gets no
+            # password hash; check_password() loads the field on access.
+            token = model.objects.select_related('user').defer(
+                'user__password').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        token_cache.set(key, token.user, token)
+        return token.user, token
@@ -0,0 +1,85 @@
+import threading
+from collections import namedtuple
+
+from django.http import HttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import count_cache
+
+STREAM_CHUNK_SIZE = 200
+
+Blob = namedtuple('Blob', 'version identity gzip')
+
+_blobs = {}
+_lock = threading.Lock()
+
+
+def get_blob(name, version, build):
+    """Rendered JSON of a catalogue, plain and gzipped, rebuilt only when
+    `version` moves. `build` returns the data to render."""
+    blob = _blobs.get(name)
+    count_cache(name + '_catalogue', blob is not None
+                and blob.version == version)
+    if blob is None or blob.version != version:
+        content = JSONRenderer().render(build())
+        blob = Blob(version, content, compress_string(content))
+        with _lock:
+            _blobs[name] = blob
+
+    return blob
+
+
+def blob_response(request, blob):
+    content = blob.identity
+    gzipped = re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if gzipped:
+        content = blob.gzip
+
+    response = HttpResponse(content, content_type=JSONRenderer.media_type)
+    response['Content-Length'] = len(content)
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def stream_json(rows, chunk_size=STREAM_CHUNK_SIZE):
+    """The JSON array JSONRenderer would produce for `rows`, encoded and
+    sent `chunk_size` rows at a time."""
+    renderer = JSONRenderer()
+    yield b'['
+    for start in range(0, len(rows), chunk_size):
+        if start:
+            yield b','
+        yield renderer.render(rows[start:start + chunk_size])[1:-1]
+    yield b']'
+
+
+def renders_plain_json(request):
+    return getattr(request, 'accepted_media_type',
+                   None) == JSONRenderer.media_type
+
+
+class CatalogueMixin:
+    """Unfiltered list served from a precompiled blob.
+
+    The blob is rebuilt when the `catalogue_stamp` version stamp moves;
+    ConditionalGetMixin must come first in the bases, it provides
+    `self.stamps`. Requests with query parameters or asking for another
+    format go through the normal list.
+    """
+    catalogue_stamp = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or not renders_plain_json(request):
+            return super().list(request, *args, **kwargs)
+
+        blob = get_blob(
+            self.catalogue_stamp, self.stamps[self.catalogue_stamp][0],
+            lambda: super(CatalogueMixin, self).list(
+                request, *args, **kwargs).data)
+        return blob_response(request, blob)
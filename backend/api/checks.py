@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.db import DEFAULT_DB_ALIAS
+
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def shared_cache_error(setting, check_id):
+    alias = getattr(settings, setting)
+    if alias not in settings.CACHES:
+        return Error('{} = {!r}: такого кэша нет в CACHES'.format(
+            setting, alias), id=check_id)
+
+    if settings.CACHES[alias]['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        return Error(
+            '{} = {!r}: кэш виден только одному процессу'.format(
+                setting, alias),
+            hint='Укажите общий для воркеров кэш, например '
+                 'FileBasedCache или memcached.',
+            id=check_id)
+
+    return None
+
+
+@register('caches')
+def check_shared_caches(app_configs, **kwargs):
+    errors = [shared_cache_error('TOKEN_AUTH_CACHE_ALIAS', 'api.E001')]
+    if settings.DATABASES.keys() - {DEFAULT_DB_ALIAS}:
+        errors.append(shared_cache_error('REPLICA_STICKY_CACHE_ALIAS',
+                                         'api.E002'))
+    if settings.MICROCACHE_TTL:
+        errors.append(shared_cache_error('MICROCACHE_ALIAS', 'api.E003'))
+    return [error for error in errors if error is not None]
@@ -0,0 +1,118 @@
+import hashlib
+import time
+from datetime import datetime
+
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import count_cache
+from foodgram.versions import get_stamps
+
+# Codings a read may be sent with (api.catalogue); each gets its own ETag.
+CONTENT_CODINGS = ('gzip',)
+
+
+def coded_etag(etag, coding):
+    """The ETag of the representation sent with Content-Encoding
+    `coding`; a gzipped body is not byte-identical to the plain one."""
+    return '{}-{}"'.format(etag[:-1], coding) if coding else etag
+
+
+def etag_variants(etag):
+    return [etag] + [coded_etag(etag, coding) for coding in CONTENT_CODINGS]
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified for read actions, derived from version stamps.
+
+    The stamps listed in `version_stamps` are bumped on every write that
+    can change the response, so a matching If-None-Match is answered with
+    304 before the queryset is touched. With `user_specific` the ETag also
+    covers the requesting user, since fields like `is_favorited` differ.
+    Values that change without a stamp bump, such as the recipe counters,
+    are covered by `etag_max_age`: the ETag changes at least that often.
+    A compressed response carries its content-coding in the ETag.
+    """
+    version_stamps = ()
+    user_specific = False
+    etag_max_age = None
+
+    def get_version_stamps(self, request):
+        return list(self.version_stamps)
+
+    def get_etag(self, request, stamps, period):
+        parts = [
+            type(self).__name__,
+            self.action,
+            request.build_absolute_uri('/'),
+            '&'.join(sorted(request.GET.urlencode().split('&'))),
+            repr(sorted(self.kwargs.items())),
+        ]
+        if self.user_specific:
+            parts.append(str(request.user.pk or 0))
+        for name, (version, _) in stamps.items():
+            parts.append('{}={}'.format(name, version))
+        if period is not None:
+            parts.append('period={}'.format(period))
+
+        return quote_etag(
+            hashlib.sha1('|'.join(parts).encode()).hexdigest())
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or any(variant in etags
+                                       for variant in etag_variants(etag))
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None and last_modified is not None
+                and int(last_modified.timestamp()) <= if_modified_since)
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        stamps = self.stamps = get_stamps(*self.get_version_stamps(request))
+        period = None
+        modified = [updated for _, updated in stamps.values() if updated]
+        if self.etag_max_age:
+            period = int(time.time()) // self.etag_max_age
+            modified.append(datetime.fromtimestamp(
+                period * self.etag_max_age, timezone.utc))
+        etag = self.get_etag(request, stamps, period)
+        last_modified = max(modified) if modified else None
+
+        not_modified = self.is_not_modified(request, etag, last_modified)
+        if 'HTTP_IF_NONE_MATCH' in request.META or (
+                'HTTP_IF_MODIFIED_SINCE' in request.META):
+            count_cache('conditional_get', not_modified)
+        if not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            # Confirm the variant the client holds.
+            etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+            etag = next((variant for variant in etag_variants(etag)
+                         if variant in etags), etag)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = coded_etag(etag, response.get('Content-Encoding'))
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        if self.user_specific:
+            patch_vary_headers(response, ['Authorization'])
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,161 @@
+"""Recipe JSON cached per recipe, with a per-request overlay.
+
+A recipe renders the same for every reader except `is_favorited`,
+`is_in_shopping_cart` and `author.is_subscribed`, plus the two counters
+that change with every favourite. The rest is rendered once, split
+around those five values and cached under the recipe's
+document_version and the tags and ingredients stamps. A page then
+costs one query for the overlay values and one cache.get_many.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse
+from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
+
+from .catalogue import renders_plain_json
+from .metrics import count_cache
+from .representations import RECIPE_ANNOTATIONS, RECIPE_FIELDS, recipes
+from foodgram import versions
+from foodgram.models import Recipe
+from user.models import Follower
+
+# Serializer fields reject NUL characters, so no stored value renders
+# the same as the placeholder.
+PLACEHOLDER = '\x00'
+RENDERED_PLACEHOLDER = JSONRenderer().render(PLACEHOLDER)
+OVERLAY_FIELDS = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed',
+                  'favourites_count', 'shopping_cart_count')
+PAGE_END = b'[]}'
+
+
+def overlay_values(queryset, user):
+    """Rows with everything a page needs besides the documents."""
+    fields = ['id', 'pub_date', 'document_version', 'favourites_count',
+              'shopping_cart_count']
+    fields += [name for name in RECIPE_ANNOTATIONS
+               if name in queryset.query.annotations]
+    if user.is_authenticated:
+        queryset = queryset.annotate(is_subscribed=Exists(
+            Follower.objects.filter(user=user, author=OuterRef('author_id'))))
+        fields.append('is_subscribed')
+
+    return queryset.prefetch_related(None).values(*fields)
+
+
+def render_document(recipe):
+    """The recipe's JSON split at the overlay values, or None if it
+    cannot be split cleanly."""
+    recipe = dict(recipe, is_favorited=PLACEHOLDER,
+                  is_in_shopping_cart=PLACEHOLDER,
+                  author=dict(recipe['author'], is_subscribed=PLACEHOLDER),
+                  favourites_count=PLACEHOLDER,
+                  shopping_cart_count=PLACEHOLDER)
+    parts = tuple(JSONRenderer().render(recipe).split(RENDERED_PLACEHOLDER))
+    return parts if len(parts) == len(OVERLAY_FIELDS) + 1 else None
+
+
+def render_value(value):
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+
+    return str(value).encode()
+
+
+def apply_overlay(parts, row):
+    chunks = [parts[0]]
+    for field, part in zip(OVERLAY_FIELDS, parts[1:]):
+        chunks.append(render_value(row.get(field, False)))
+        chunks.append(part)
+
+    return b''.join(chunks)
+
+
+def get_documents(rows, request, stamps):
+    """Rendered recipes for overlay_values() rows, in order, or None
+    when some recipe could not be rendered from the cache."""
+    base = hashlib.sha1(
+        request.build_absolute_uri('/').encode()).hexdigest()[:12]
+    keys = {row['id']: 'recipe-doc:{}:{}:{}:{}:{}'.format(
+        base, row['id'], row['document_version'],
+        stamps[versions.TAGS][0], stamps[versions.INGREDIENTS][0])
+        for row in rows}
+    documents = cache.get_many(list(keys.values()))
+    missing = [recipe_id for recipe_id, key in keys.items()
+               if key not in documents]
+    for _ in range(len(keys) - len(missing)):
+        count_cache('recipe_document', True)
+
+    if missing:
+        built = {}
+        for recipe in recipes(
+                Recipe.objects.filter(pk__in=missing).values(*RECIPE_FIELDS),
+                request, AnonymousUser()):
+            count_cache('recipe_document', False)
+            parts = render_document(recipe)
+            if parts is None:
+                return None
+            built[keys[recipe['id']]] = parts
+        cache.set_many(built, settings.RECIPE_DOCUMENT_TTL)
+        documents.update(built)
+
+    if len(documents) < len(keys):
+        return None
+
+    return [apply_overlay(documents[keys[row['id']]], row) for row in rows]
+
+
+class RecipeDocumentMixin:
+    """list and retrieve assembled from cached recipe documents.
+
+    Needs `self.stamps` with the tags and ingredients stamps from
+    ConditionalGetMixin. Other formats, FAST_SERIALIZATION = False and
+    RECIPE_DOCUMENT_TTL = 0 go through the normal path.
+    """
+
+    def use_documents(self, request):
+        return (settings.RECIPE_DOCUMENT_TTL
+                and settings.FAST_SERIALIZATION
+                and renders_plain_json(request))
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_documents(request):
+            return super().list(request, *args, **kwargs)
+
+        rows = overlay_values(self.filter_queryset(self.get_queryset()),
+                              request.user)
+        page = self.paginate_queryset(rows)
+        documents = get_documents(rows if page is None else page, request,
+                                  self.stamps)
+        if documents is None:
+            return super().list(request, *args, **kwargs)
+
+        content = b'[' + b','.join(documents) + b']'
+        if page is not None:
+            wrapper = JSONRenderer().render(
+                self.get_paginated_response([]).data)
+            if not wrapper.endswith(PAGE_END):
+                return super().list(request, *args, **kwargs)
+            content = wrapper[:-len(PAGE_END)] + content + b'}'
+
+        return HttpResponse(content, content_type=JSONRenderer.media_type)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_documents(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            overlay_values(self.filter_queryset(self.get_queryset()),
+                           request.user),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        documents = get_documents([row], request, self.stamps)
+        if documents is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        return HttpResponse(documents[0],
+                            content_type=JSONRenderer.media_type)
@@ -0,0 +1,33 @@
+import io
+
+from django.conf import settings
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+
+class LimitedBase64ImageField(Base64ImageField):
+    """Base64ImageField that refuses oversized uploads before decoding
+    them and checks the pixel count from the image header alone."""
+
+    def to_internal_value(self, base64_data):
+        if (isinstance(base64_data, str)
+                and len(base64_data) > settings.IMAGE_MAX_UPLOAD_SIZE * 4 // 3
+                + 1024):
+            raise ValidationError('Картинка больше {} МБ'.format(
+                settings.IMAGE_MAX_UPLOAD_SIZE // 2 ** 20))
+
+        return super().to_internal_value(base64_data)
+
+    def get_file_extension(self, filename, decoded_file):
+        try:
+            width, height = Image.open(io.BytesIO(decoded_file)).size
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше {} мегапикселей'.format(
+                    settings.IMAGE_MAX_PIXELS // 10 ** 6))
+
+        return super().get_file_extension(filename, decoded_file)
@@ -1,14 +1,55 @@
 import django_filters as df
-from django.db.models import Q
+from django import forms
+from django.db.models import Exists, OuterRef
 
-from foodgram.models import Ingredient, Recipe
+from .search import search_recipes
+from .utils import get_tag_registry
+from foodgram import versions
+from foodgram.models import Favourite, Ingredient, Recipe, ShoppingCart
+
+
+class SlugListField(forms.MultipleChoiceField):
+    def valid_value(self, value):
+        return True
+
+
+class TagSlugFilter(df.MultipleChoiceFilter):
+    """Tag slugs resolved through the cached tag registry.
+
+    Recipes are matched with an EXISTS subquery on the recipe/tag table,
+    so a recipe with several of the requested tags is returned once
+    without DISTINCT. Unknown slugs match nothing.
+    """
+    field_class = SlugListField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        registry = get_tag_registry(self.loaded_tags_version())
+        tag_ids = [registry[slug] for slug in value if slug in registry]
+        return qs.annotate(has_tags=Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids),
+        )).filter(has_tags=True)
+
+    def loaded_tags_version(self):
+        """The tags stamp ConditionalGetMixin read for this request, if
+        any, so the registry check costs no query of its own."""
+        request = getattr(self.parent, 'request', None)
+        view = (getattr(request, 'parser_context', None) or {}).get('view')
+        stamps = getattr(view, 'stamps', {})
+        if versions.TAGS in stamps:
+            return stamps[versions.TAGS][0]
+        return None
 
 
 class RecipeFilter(df.FilterSet):
     author = df.NumberFilter(field_name='author__id', lookup_expr='exact')
     is_favorited = df.NumberFilter(method='_is_favorited')
     is_in_shopping_cart = df.NumberFilter(method='_is_in_shopping_cart')
-    tags = df.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagSlugFilter()
+    search = df.CharFilter(method='_search')
 
     def __init__(self, *args, **kwargs):
         self.current_user = None
@@ -20,16 +61,36 @@ class RecipeFilter(df.FilterSet):
         super(RecipeFilter, self).__init__(*args, **kwargs)
 
     def _is_favorited(self, qs, name, value):
-        if value == 1:
-            return qs.filter(favourites__user=self.current_user)
-
-        return qs.filter(~Q(favourites__user=self.current_user))
+        return self.filter_by_link(qs, 'is_favorited', Favourite, value)
 
     def _is_in_shopping_cart(self, qs, name, value):
+        return self.filter_by_link(qs, 'is_in_shopping_cart', ShoppingCart,
+                                   value)
+
+    def filter_by_link(self, qs, annotation, model, value):
+        """Recipes with (value=1) or without a user-recipe link.
+
+        The positive case is an IN subquery, which the planner turns into
+        a semi-join driven by the (user, recipe) index; the negative case
+        is NOT EXISTS, reusing the view's annotation when there is one.
+        An anonymous user has no links, so no SQL is needed for them.
+        """
+        user = self.current_user
+        if user is None or not user.is_authenticated:
+            return qs.none() if value == 1 else qs
+
+        links = model.objects.filter(user=user)
         if value == 1:
-            return qs.filter(shopping_cart__user=self.current_user)
+            return qs.filter(pk__in=links.values('recipe'))
+
+        if annotation not in qs.query.annotations:
+            qs = qs.annotate(**{annotation: Exists(
+                links.filter(recipe=OuterRef('pk')))})
+
+        return qs.filter(**{annotation: False})
 
-        return qs.filter(~Q(shopping_cart__user=self.current_user))
+    def _search(self, qs, name, value):
+        return search_recipes(qs, value)
 
     class Meta:
         model = Recipe
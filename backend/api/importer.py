@@ -0,0 +1,166 @@
+import json
+import time
+
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from rest_framework import serializers
+
+from .search import update_search_vectors
+from .serializers import RecipeWriteSerializer
+from foodgram import counters, images, versions
+from foodgram.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from jobs.queue import job
+from user.models import User
+
+DEFAULT_CHUNK_SIZE = 200
+
+# What RecipeWriteSerializer's id fields accept, so "3" finds tag 3 too.
+to_id = serializers.IntegerField().to_internal_value
+
+
+class RecipeImportSerializer(RecipeWriteSerializer):
+    """RecipeWriteSerializer that checks ids against sets resolved once
+    per chunk instead of querying for every document."""
+
+    def find_tags(self, ids):
+        return self.context['tag_ids'].intersection(ids)
+
+    def find_ingredients(self, ids):
+        return self.context['ingredient_ids'].intersection(ids)
+
+
+def collect_ids(document, key, field=None):
+    items = document.get(key) if isinstance(document, dict) else None
+    if not isinstance(items, list):
+        return set()
+
+    ids = set()
+    for item in items:
+        value = item.get(field) if field and isinstance(item, dict) else item
+        try:
+            ids.add(to_id(value))
+        except serializers.ValidationError:
+            pass
+    return ids
+
+
+class RecipeImporter:
+    """Imports NDJSON documents shaped like RecipeWriteSerializer input.
+
+    Lines are validated and written per chunk; a bad line is reported
+    with its number and does not stop the rest of the import.
+    """
+
+    def __init__(self, author, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.author = author
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors = []
+
+    def run(self, lines):
+        started = time.monotonic()
+        chunk = []
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+
+            try:
+                chunk.append((number, json.loads(line)))
+            except ValueError as error:
+                self.errors.append({'line': number, 'errors': str(error)})
+                continue
+
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            self.import_chunk(chunk)
+
+        elapsed = time.monotonic() - started
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'seconds': round(elapsed, 3),
+            'recipes_per_second': round(self.created / max(elapsed, 1e-9)),
+        }
+
+    def import_chunk(self, chunk):
+        tag_ids = set()
+        ingredient_ids = set()
+        for _, document in chunk:
+            tag_ids |= collect_ids(document, 'tags')
+            ingredient_ids |= collect_ids(document, 'ingredients', 'id')
+        context = {
+            'tag_ids': set(Tag.objects.filter(
+                id__in=tag_ids).values_list('id', flat=True)),
+            'ingredient_ids': set(Ingredient.objects.filter(
+                id__in=ingredient_ids).values_list('id', flat=True)),
+        }
+
+        valid = []
+        for number, document in chunk:
+            serializer = RecipeImportSerializer(data=document,
+                                                context=context)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.errors.append(
+                    {'line': number, 'errors': serializer.errors})
+
+        if not valid:
+            return
+
+        try:
+            with transaction.atomic():
+                self.write(valid)
+        except DatabaseError as error:
+            self.errors.extend({'line': number, 'errors': str(error)}
+                               for number, _ in valid)
+        else:
+            self.created += len(valid)
+
+    def write(self, valid):
+        recipes = []
+        for _, data in valid:
+            data = dict(data)
+            data.pop('tags')
+            data.pop('ingredientinrecipe_set')
+            recipes.append(Recipe(author=self.author, **data))
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create sends no post_save to count them.
+            counters.increment(User, self.author.pk, 'recipes_count',
+                               len(recipes))
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, (_, data) in zip(recipes, valid)
+            for tag_id in data['tags'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe_id=recipe.pk,
+                               ingredient_id=item['ingredient']['id'],
+                               amount=item['amount'])
+            for recipe, (_, data) in zip(recipes, valid)
+            for item in data['ingredientinrecipe_set'])
+        update_search_vectors([recipe.pk for recipe in recipes])
+        images.schedule_variants_many(recipes)
+        versions.bump(versions.RECIPES)
+
+
+@job(max_attempts=1)
+def import_file(path, author_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Background variant of the import for an upload kept in storage."""
+    author = User.objects.get(pk=author_id)
+    try:
+        with default_storage.open(path, 'rb') as file:
+            return RecipeImporter(author, chunk_size).run(file)
+    finally:
+        default_storage.delete(path)
@@ -0,0 +1,115 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_PREVIEW_LENGTH = 300
+
+
+class RequestStats:
+    """SQL and timing figures collected while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = ''
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+    def timings(self):
+        total = time.perf_counter() - self.started
+        return {
+            'total': total,
+            'db': self.db_time,
+            'render': self.render_time,
+            'app': max(total - self.db_time - self.render_time, 0.0),
+        }
+
+
+def server_timing(stats, timings):
+    return ', '.join([
+        'db;dur={:.1f};desc="{} queries"'.format(
+            timings['db'] * 1000, stats.queries),
+        'app;dur={:.1f};desc="view and serializers"'.format(
+            timings['app'] * 1000),
+        'render;dur={:.1f}'.format(timings['render'] * 1000),
+        'total;dur={:.1f}'.format(timings['total'] * 1000),
+    ])
+
+
+class InstrumentationMiddleware:
+    """Per-request query count, SQL time, slowest statement and
+    view/render split, reported as Server-Timing and one JSON log line.
+
+    Requests over REQUEST_QUERY_BUDGET queries or REQUEST_TIME_BUDGET_MS
+    are logged as warnings. The same figures feed the /metrics
+    histograms. The cost is a perf_counter pair per query.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_INSTRUMENTATION:
+            return self.get_response(request)
+
+        stats = request.stats = RequestStats()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+
+        timings = stats.timings()
+        response['Server-Timing'] = server_timing(stats, timings)
+        metrics.observe_request(request, response, stats, timings)
+        self.log(request, response, stats, timings)
+        return response
+
+    def log(self, request, response, stats, timings):
+        over_budget = []
+        if stats.queries > settings.REQUEST_QUERY_BUDGET:
+            over_budget.append('queries')
+        if timings['total'] * 1000 > settings.REQUEST_TIME_BUDGET_MS:
+            over_budget.append('time')
+
+        level = logging.WARNING if over_budget else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+
+        user = getattr(request, 'user', None)
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user': getattr(user, 'pk', None),
+            'queries': stats.queries,
+            'total_ms': round(timings['total'] * 1000, 1),
+            'db_ms': round(timings['db'] * 1000, 1),
+            'app_ms': round(timings['app'] * 1000, 1),
+            'render_ms': round(timings['render'] * 1000, 1),
+            'slowest_ms': round(stats.slowest_time * 1000, 1),
+            'slowest_sql': stats.slowest_sql[:SQL_PREVIEW_LENGTH],
+            'over_budget': over_budget,
+        }, ensure_ascii=False))
@@ -0,0 +1,280 @@
+import base64
+import io
+import json
+import math
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.commands.seed_bench import PASSWORD, USERNAME_PREFIX
+from foodgram.models import Ingredient, Recipe, Tag
+from jobs.models import Job
+from user.models import User
+
+REGISTRATION_PREFIX = 'bench_reg_'
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def tiny_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все эндпоинты api/urls.py через тестовый клиент и '
+            'выводит p50/p95, число SQL-запросов и размер ответа в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help='только эндпоинты с этой '
+                                           'подстрокой в имени')
+        parser.add_argument('--output', help='файл для отчёта в JSON')
+        parser.add_argument('--compare', help='прошлый отчёт для сравнения')
+
+    def handle(self, *args, **options):
+        self.prepare()
+        self.only = options['only']
+        self.samples = defaultdict(list)
+        first_job = Job.objects.aggregate(last=Max('id'))['last'] or 0
+        # Recipes created by the run upload images; they go to a throwaway
+        # MEDIA_ROOT so the benchmark leaves nothing behind in media/.
+        media_root = tempfile.mkdtemp(prefix='foodgram_bench_')
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                for _ in range(options['warmup']):
+                    self.run_iteration()
+                self.samples.clear()
+                for _ in range(options['iterations']):
+                    self.run_iteration()
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+            User.objects.filter(
+                username__startswith=REGISTRATION_PREFIX).delete()
+            Job.objects.filter(id__gt=first_job).delete()
+
+        report = {
+            'revision': git_revision(),
+            'vendor': connection.vendor,
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'endpoints': {name: self.summarize(samples)
+                          for name, samples in self.samples.items()},
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self.compare(json.load(file), report)
+
+    def prepare(self):
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        self.user = users.order_by('-following_count', 'id').first()
+        self.other = users.exclude(pk=getattr(self.user, 'pk', None)).filter(
+            shopping_cart__isnull=False).order_by('id').first()
+        self.admin = User.objects.filter(is_superuser=True).first()
+        if self.user is None or self.other is None:
+            raise CommandError('Нет данных, выполните seed_bench')
+
+        self.client = self.client_for(self.user)
+        self.anonymous = APIClient()
+        self.admin_client = self.client_for(self.admin)
+        self.recipe = Recipe.objects.order_by('-favourites_count').first()
+        self.foreign_recipe = Recipe.objects.exclude(
+            author=self.user).exclude(favourites__user=self.user).exclude(
+            shopping_cart__user=self.user).order_by('id').first()
+        self.author = User.objects.exclude(pk=self.user.pk).exclude(
+            following__user=self.user).filter(
+            username__startswith=USERNAME_PREFIX).first()
+        self.tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        self.ingredients = list(Ingredient.objects.values_list(
+            'id', flat=True)[:5])
+        self.image = tiny_png()
+        self.job = Job.objects.create(name='bench', status=Job.DONE,
+                                      user=self.user)
+
+    def client_for(self, user):
+        if user is None:
+            return None
+
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        return client
+
+    def request(self, name, client, method, path, data=None):
+        if client is None or (self.only and self.only not in name):
+            return None
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if isinstance(data, str):
+                response = client.generic(
+                    method.upper(), path, data,
+                    content_type='application/x-ndjson')
+            else:
+                response = getattr(client, method)(path, data,
+                                                   format='json')
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+
+        self.samples[name].append(
+            (elapsed, len(queries.captured_queries), size,
+             response.status_code))
+        return response
+
+    def recipe_body(self):
+        return {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для замеров',
+            'cooking_time': 15,
+            'tags': self.tag_ids,
+            'image': self.image,
+            'ingredients': [{'id': ingredient_id, 'amount': 100}
+                            for ingredient_id in self.ingredients],
+        }
+
+    def run_iteration(self):
+        client, anonymous = self.client, self.anonymous
+        recipe_id = self.recipe.pk
+
+        self.request('users:list', client, 'get', '/api/users/')
+        self.request('users:me', client, 'get', '/api/users/me/')
+        self.request('users:retrieve', client, 'get',
+                     '/api/users/{}/'.format(self.author.pk))
+        self.request('tags:list', anonymous, 'get', '/api/tags/')
+        self.request('tags:retrieve', anonymous, 'get',
+                     '/api/tags/{}/'.format(self.tag_ids[0]))
+        self.request('ingredients:list', anonymous, 'get',
+                     '/api/ingredients/')
+        self.request('ingredients:search', anonymous, 'get',
+                     '/api/ingredients/', {'name': 'мо'})
+        self.request('ingredients:retrieve', anonymous, 'get',
+                     '/api/ingredients/{}/'.format(self.ingredients[0]))
+        self.request('recipes:list:anonymous', anonymous, 'get',
+                     '/api/recipes/')
+        self.request('recipes:list', client, 'get', '/api/recipes/')
+        self.request('recipes:list:tags', client, 'get', '/api/recipes/',
+                     {'tags': self.tags})
+        self.request('recipes:list:favorited', client, 'get',
+                     '/api/recipes/', {'is_favorited': 1})
+        self.request('recipes:list:search', client, 'get', '/api/recipes/',
+                     {'search': 'пирог'})
+        self.request('recipes:list:cursor', client, 'get', '/api/recipes/',
+                     {'pagination': 'cursor'})
+        self.request('recipes:retrieve', client, 'get',
+                     '/api/recipes/{}/'.format(recipe_id))
+        self.request('users:subscriptions', client, 'get',
+                     '/api/users/subscriptions/')
+        self.request('download_shopping_cart', self.client_for(self.other),
+                     'get', '/api/recipes/download_shopping_cart/')
+        self.request('jobs:retrieve', client, 'get',
+                     '/api/jobs/{}/'.format(self.job.pk))
+
+        foreign_id = self.foreign_recipe.pk
+        for name in ('favorite', 'shopping_cart'):
+            path = '/api/recipes/{}/{}/'.format(foreign_id, name)
+            self.request(name + ':post', client, 'post', path)
+            self.request(name + ':delete', client, 'delete', path)
+
+        path = '/api/users/{}/subscribe/'.format(self.author.pk)
+        self.request('subscribe:post', client, 'post', path)
+        self.request('subscribe:delete', client, 'delete', path)
+
+        response = self.request('recipes:create', client, 'post',
+                                '/api/recipes/', self.recipe_body())
+        if response is not None and response.status_code == 201:
+            path = '/api/recipes/{}/'.format(response.data['id'])
+            self.request('recipes:partial_update', client, 'patch', path,
+                         dict(self.recipe_body(), name='Бенчмарк 2'))
+            self.request('recipes:destroy', client, 'delete', path)
+
+        line = json.dumps(self.recipe_body(), ensure_ascii=False)
+        response = self.request('recipes:import', self.admin_client, 'post',
+                                '/api/recipes/import/', line + '\n')
+        if response is not None:
+            Recipe.objects.filter(author=self.admin,
+                                  name='Бенчмарк').delete()
+
+        username = '{}{}'.format(REGISTRATION_PREFIX, time.monotonic_ns())
+        self.request('users:create', anonymous, 'post', '/api/users/', {
+            'email': username + '@bench.local', 'username': username,
+            'first_name': 'Bench', 'last_name': 'Reg',
+            'password': PASSWORD})
+        self.request('users:set_password', client, 'post',
+                     '/api/users/set_password/',
+                     {'new_password': PASSWORD,
+                      'current_password': PASSWORD})
+
+        response = self.request('auth:login', anonymous, 'post',
+                                '/api/auth/token/login/',
+                                {'email': self.other.email,
+                                 'password': PASSWORD})
+        if response is not None and response.status_code == 201:
+            session = APIClient()
+            session.credentials(HTTP_AUTHORIZATION='Token '
+                                + response.data['auth_token'])
+            self.request('auth:logout', session, 'post',
+                         '/api/auth/token/logout/')
+
+    def summarize(self, samples):
+        times = [elapsed * 1000 for elapsed, _, _, _ in samples]
+        return {
+            'p50_ms': round(percentile(times, 0.5), 2),
+            'p95_ms': round(percentile(times, 0.95), 2),
+            'mean_ms': round(sum(times) / len(times), 2),
+            'queries': max(queries for _, queries, _, _ in samples),
+            'bytes': max(size for _, _, size, _ in samples),
+            'statuses': sorted({code for _, _, _, code in samples}),
+        }
+
+    def compare(self, before, after):
+        self.stdout.write('{:<28} {:>10} {:>10} {:>8} {:>9}'.format(
+            'эндпоинт', 'p50 было', 'p50 стало', 'запросы', 'байты'))
+        for name, current in sorted(after['endpoints'].items()):
+            previous = before['endpoints'].get(name)
+            if previous is None:
+                continue
+            self.stdout.write(
+                '{:<28} {:>10.2f} {:>10.2f} {:>+8} {:>+9}'.format(
+                    name, previous['p50_ms'], current['p50_ms'],
+                    current['queries'] - previous['queries'],
+                    current['bytes'] - previous['bytes']))
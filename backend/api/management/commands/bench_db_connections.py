@@ -0,0 +1,60 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as Direct
+
+from backend.postgresql_pool.base import DatabaseWrapper as Pooled
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def requests(wrapper_class, settings_dict, alias, iterations):
+    """What each request does with CONN_MAX_AGE = 0: connect, one
+    query, close."""
+    wrapper = wrapper_class(dict(settings_dict), alias)
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        wrapper.close()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает накладные расходы на соединение с PostgreSQL '
+            'на каждый запрос: без пула и с пулом backend.postgresql_pool.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужна база PostgreSQL')
+
+        settings_dict = connection.settings_dict
+        self.stdout.write('{:<10} {:>10} {:>10} {:>10}'.format(
+            'режим', 'p50, мс', 'p95, мс', 'запр./с'))
+        for name, wrapper_class in (('без пула', Direct),
+                                    ('пул', Pooled)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as executor:
+                results = executor.map(
+                    lambda _: requests(wrapper_class, settings_dict,
+                                       'bench_' + wrapper_class.__module__,
+                                       options['iterations']),
+                    range(options['threads']))
+                times = [value for result in results for value in result]
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write('{:<10} {:>10.2f} {:>10.2f} {:>10.0f}'.format(
+                name, percentile(times, 0.5) * 1000,
+                percentile(times, 0.95) * 1000, len(times) / elapsed))
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.search import build_ingredient_index
+from foodgram.models import Ingredient
+
+DEFAULT_QUERIES = ['а', 'мо', 'мол', 'сах', 'перец', 'масло', 'ёж', 'ЯБЛ']
+
+
+def bench(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat, len(result)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов через ORM-фильтр name__contains '
+            'и через индекс api.search.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError('Нет ингредиентов, выполните load_ingredients')
+
+        repeat = options['repeat']
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        started = time.perf_counter()
+        index = build_ingredient_index()
+        self.stdout.write('индекс: {} строк, построен за {:.1f} мс'.format(
+            len(index), (time.perf_counter() - started) * 1000))
+        self.stdout.write('{:<10} {:>12} {:>8} {:>12} {:>8} {:>8}'.format(
+            'запрос', 'orm, мкс', 'строк', 'индекс, мкс', 'строк',
+            'ускор.'))
+        for query in options['queries']:
+            orm_time, orm_rows = bench(
+                lambda: list(Ingredient.objects
+                             .filter(name__contains=query)
+                             .values('id', 'name', 'unit')),
+                repeat)
+            index_time, index_rows = bench(
+                lambda: index.search(query, limit), repeat)
+            self.stdout.write(
+                '{:<10} {:>12.0f} {:>8} {:>12.0f} {:>8} {:>7.0f}x'.format(
+                    query, orm_time * 1e6, orm_rows, index_time * 1e6,
+                    index_rows, orm_time / max(index_time, 1e-9)))
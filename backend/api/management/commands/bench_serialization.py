@@ -0,0 +1,166 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.representations import (INGREDIENT_FIELDS, TAG_FIELDS, ingredients,
+                                 recipe_values, recipes, tags)
+from api.serializers import (IngredientSerializer, RecipeReadSerializer,
+                             TagSerializer)
+from api.views import RecipeViewSet
+from foodgram.models import Ingredient, Recipe, Tag
+from user.models import User
+
+CHUNK_SIZE = 100
+
+
+def make_request(user):
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = user or AnonymousUser()
+    return request
+
+
+def recipe_queryset(request):
+    view = RecipeViewSet(request=request, format_kwarg=None)
+    return view.get_queryset().order_by('-pub_date', '-id')
+
+
+def serialized(name, request, queryset):
+    context = {'request': request}
+    if name == 'tags':
+        return TagSerializer(queryset, many=True, context=context).data
+    if name == 'ingredients':
+        return IngredientSerializer(queryset, many=True,
+                                    context=context).data
+    return RecipeReadSerializer(queryset, many=True, context=context).data
+
+
+def represented(name, request, queryset):
+    if name == 'tags':
+        return tags(queryset.values(*TAG_FIELDS))
+    if name == 'ingredients':
+        return ingredients(queryset.values(*INGREDIENT_FIELDS))
+    return recipes(recipe_values(queryset), request)
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что быстрый вывод рецептов, тэгов и ингредиентов '
+            'совпадает с сериализаторами байт в байт, и сравнивает '
+            'их скорость в объектах в секунду.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3,
+                            help='сколько пользователей проверить кроме '
+                                 'анонимного')
+        parser.add_argument('--recipes', type=int, default=100,
+                            help='рецептов в замере')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--skip-check', action='store_true')
+
+    def handle(self, *args, **options):
+        users = [None] + list(User.objects.filter(
+            favourites__isnull=False).distinct().order_by('id')[
+                :options['users']])
+        if not options['skip_check']:
+            for user in users:
+                self.check_objects(user)
+                self.check_endpoints(user)
+            self.stdout.write('вывод совпадает для {} пользователей'.format(
+                len(users)))
+
+        request = make_request(users[-1])
+        querysets = {
+            'tags': Tag.objects.order_by('id'),
+            'ingredients': Ingredient.objects.order_by('id'),
+            'recipes': recipe_queryset(request)[:options['recipes']],
+        }
+        renderer = JSONRenderer()
+        self.stdout.write('{:<12} {:>8} {:>12} {:>12} {:>8}'.format(
+            'ресурс', 'объектов', 'drf, об/с', 'values, об/с', 'ускор.'))
+        for name, queryset in querysets.items():
+            count = queryset.count()
+            timings = []
+            for build in (serialized, represented):
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    renderer.render(build(name, request, queryset.all()))
+                timings.append((time.perf_counter() - started)
+                               / options['repeat'])
+
+            self.stdout.write('{:<12} {:>8} {:>12.0f} {:>12.0f} {:>7.1f}x'
+                              .format(name, count, count / timings[0],
+                                      count / timings[1],
+                                      timings[0] / timings[1]))
+
+    def compare(self, label, expected, actual):
+        if expected != actual:
+            position = next((index for index, (left, right) in enumerate(
+                zip(expected, actual)) if left != right),
+                min(len(expected), len(actual)))
+            raise CommandError('{}: вывод различается с байта {}:\n{}\n{}'
+                               .format(label, position,
+                                       expected[position - 80:position + 80],
+                                       actual[position - 80:position + 80]))
+
+    def check_objects(self, user):
+        """Every tag, ingredient and recipe, rendered both ways."""
+        renderer = JSONRenderer()
+        request = make_request(user)
+        querysets = [('tags', Tag.objects.order_by('id')),
+                     ('ingredients', Ingredient.objects.order_by('id'))]
+        recipe_ids = list(Recipe.objects.order_by('id').values_list(
+            'id', flat=True))
+        for start in range(0, len(recipe_ids), CHUNK_SIZE):
+            querysets.append(('recipes', recipe_queryset(request).filter(
+                id__in=recipe_ids[start:start + CHUNK_SIZE])))
+
+        for name, queryset in querysets:
+            self.compare('{} ({})'.format(name, user),
+                         renderer.render(serialized(name, request,
+                                                    queryset.all())),
+                         renderer.render(represented(name, request,
+                                                     queryset.all())))
+
+    def check_endpoints(self, user):
+        """Whole responses of the read endpoints, with filters and
+        pagination, with FAST_SERIALIZATION off and on, the latter twice
+        to go through both a cold and a warm recipe document cache."""
+        client = APIClient()
+        client.force_authenticate(user)
+        recipe = Recipe.objects.order_by('-id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        paths = [
+            ('/api/recipes/', {}),
+            ('/api/recipes/', {'page': 2, 'limit': 10}),
+            ('/api/recipes/', {'pagination': 'cursor', 'limit': 10}),
+            ('/api/recipes/', {'is_favorited': 1}),
+            ('/api/recipes/', {'is_in_shopping_cart': 0}),
+            ('/api/recipes/', {'search': 'суп'}),
+            ('/api/tags/', {}),
+            ('/api/ingredients/', {}),
+        ]
+        if recipe is not None:
+            paths.append(('/api/recipes/{}/'.format(recipe.pk), {}))
+            paths.append(('/api/recipes/', {'author': recipe.author_id}))
+        if tag is not None:
+            paths.append(('/api/tags/{}/'.format(tag.pk), {}))
+            paths.append(('/api/recipes/', {'tags': tag.slug}))
+        if ingredient is not None:
+            paths.append(('/api/ingredients/{}/'.format(ingredient.pk), {}))
+        paths.append(('/api/recipes/0/', {}))
+
+        for path, params in paths:
+            responses = []
+            for fast in (False, True, True):
+                with override_settings(FAST_SERIALIZATION=fast,
+                                       MICROCACHE_TTL=0):
+                    response = client.get(path, params)
+                responses.append((response.status_code, response.content))
+            for response in responses[1:]:
+                self.compare('{} {} ({})'.format(path, params, user),
+                             repr(responses[0]), repr(response))
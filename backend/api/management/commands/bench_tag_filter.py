@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.filters import RecipeFilter
+from foodgram.models import Recipe, Tag
+from user.models import User
+
+PAGE_SIZE = 6
+SEED_BATCH = 10000
+
+
+def bench(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def distinct_join(slugs):
+    """What AllValuesMultipleFilter did: build the choices, then join."""
+    list(Recipe.objects.distinct().order_by('tags__slug').values_list(
+        'tags__slug', flat=True))
+    queryset = Recipe.objects.filter(tags__slug__in=slugs).distinct()
+    return queryset.count(), list(queryset.order_by(
+        '-pub_date', '-id').values_list('id', flat=True)[:PAGE_SIZE])
+
+
+def tag_exists(slugs):
+    queryset = RecipeFilter({'tags': slugs},
+                            queryset=Recipe.objects.all()).qs
+    return queryset.count(), list(queryset.order_by(
+        '-pub_date', '-id').values_list('id', flat=True)[:PAGE_SIZE])
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтр рецептов по тэгам через JOIN с DISTINCT '
+            'и через EXISTS с реестром тэгов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='сначала добавить столько рецептов '
+                                 'со случайными тэгами')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        slugs = list(Tag.objects.order_by('id').values_list(
+            'slug', flat=True))
+        if not slugs:
+            raise CommandError('Нет тэгов')
+
+        if options['seed']:
+            self.seed(options['seed'], list(Tag.objects.values_list(
+                'id', flat=True)))
+
+        self.stdout.write('рецептов: {}, связей с тэгами: {}'.format(
+            Recipe.objects.count(), Recipe.tags.through.objects.count()))
+        self.stdout.write('{:<24} {:>12} {:>12} {:>10} {:>8}'.format(
+            'тэги', 'join, мс', 'exists, мс', 'рецептов', 'ускор.'))
+        for size in range(1, len(slugs) + 1):
+            chosen = slugs[:size]
+            join_time, join_result = bench(
+                lambda: distinct_join(chosen), options['repeat'])
+            exists_time, exists_result = bench(
+                lambda: tag_exists(chosen), options['repeat'])
+            if join_result != exists_result:
+                raise CommandError('результаты различаются для {}'.format(
+                    chosen))
+
+            self.stdout.write(
+                '{:<24} {:>12.1f} {:>12.1f} {:>10} {:>7.1f}x'.format(
+                    ','.join(chosen)[:24], join_time * 1000,
+                    exists_time * 1000, exists_result[0],
+                    join_time / max(exists_time, 1e-9)))
+
+    def seed(self, total, tag_ids):
+        author = User.objects.order_by('id').first()
+        if author is None:
+            raise CommandError('Нет пользователей')
+
+        created = 0
+        while created < total:
+            size = min(SEED_BATCH, total - created)
+            with transaction.atomic():
+                Recipe.objects.bulk_create(
+                    Recipe(author=author, name='bench {}'.format(
+                        created + number), text='bench', cooking_time=10)
+                    for number in range(size))
+                recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+                    'id', flat=True)[:size])
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in random.sample(
+                        tag_ids, random.randint(1, len(tag_ids))))
+            created += size
+            self.stdout.write('добавлено {}'.format(created))
@@ -0,0 +1,51 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import DEFAULT_CHUNK_SIZE, RecipeImporter
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = ('Импортирует рецепты из NDJSON (по документу в формате '
+            'POST /api/recipes/ на строку).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл NDJSON или - для stdin')
+        parser.add_argument('--author', required=True,
+                            help='username или email автора рецептов')
+        parser.add_argument('--chunk-size', type=int,
+                            default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--report', help='файл для отчёта в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            try:
+                author = User.objects.get(email=options['author'])
+            except User.DoesNotExist:
+                raise CommandError('Автор {} не найден'.format(
+                    options['author']))
+
+        importer = RecipeImporter(author, options['chunk_size'])
+        if options['path'] == '-':
+            report = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                report = importer.run(file)
+
+        for error in report['errors']:
+            self.stderr.write('строка {}: {}'.format(
+                error['line'],
+                json.dumps(error['errors'], ensure_ascii=False)))
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(
+            'создано: {created}, с ошибками: {failed}; '
+            '{recipes_per_second} рецептов/с за {seconds} с'.format(
+                **report)))
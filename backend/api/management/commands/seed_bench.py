@@ -0,0 +1,230 @@
+import csv
+import os
+import random
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.search import update_search_vectors
+from foodgram import counters, shopping_list, versions
+from foodgram.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from user.models import Follower, User
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv')
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 2000
+DEFAULT_TAGS = [
+    ('Завтрак', 'e26c2d', 'breakfast'),
+    ('Обед', '49b64e', 'lunch'),
+    ('Ужин', '8775d2', 'dinner'),
+    ('Десерт', 'f9a62b', 'dessert'),
+    ('Выпечка', 'c46e3e', 'bakery'),
+    ('Салат', '74c365', 'salad'),
+    ('Суп', 'ffb347', 'soup'),
+    ('Напиток', '4fa3d1', 'drink'),
+]
+WORDS = ['пирог', 'суп', 'салат', 'рагу', 'паста', 'запеканка', 'каша',
+         'омлет', 'котлеты', 'плов', 'блины', 'соус', 'пюре', 'жаркое']
+
+
+def pareto_weights(count, rng, alpha=1.2):
+    """Cumulative heavy-tailed weights: a few items get most picks."""
+    return list(accumulate(rng.paretovariate(alpha) for _ in range(count)))
+
+
+def zipf_weights(count):
+    return list(accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+def sample_distinct(rng, population, cum_weights, size):
+    size = min(size, len(population))
+    chosen = set()
+    while len(chosen) < size:
+        chosen.update(rng.choices(population, cum_weights=cum_weights,
+                                  k=size - len(chosen)))
+    return chosen
+
+
+def batched(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетический набор данных для нагрузочных замеров: '
+            'пользователей bench_*, рецепты, избранное, корзины и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favourites', type=float, default=15,
+                            help='среднее число избранных на пользователя')
+        parser.add_argument('--carts', type=float, default=3,
+                            help='среднее число рецептов в корзине')
+        parser.add_argument('--follows', type=float, default=10,
+                            help='среднее число подписок на пользователя')
+        parser.add_argument('--ingredients', default=DEFAULT_PATH,
+                            help='CSV с ингредиентами (название,единица)')
+        parser.add_argument('--random-seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true',
+                            help='сначала удалить пользователей bench_* '
+                                 'и их данные')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        started = time.monotonic()
+        if options['clear']:
+            deleted = User.objects.filter(
+                username__startswith=USERNAME_PREFIX).delete()[0]
+            self.stdout.write('удалено объектов: {}'.format(deleted))
+
+        with transaction.atomic():
+            ingredient_ids = self.ensure_ingredients(options['ingredients'])
+            tag_ids = self.ensure_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                rng, user_ids, options['recipes'], ingredient_ids, tag_ids)
+            self.create_links(rng, Favourite, user_ids, recipe_ids,
+                              options['favourites'])
+            cart_users = self.create_links(rng, ShoppingCart, user_ids,
+                                           recipe_ids, options['carts'])
+            self.create_follows(rng, user_ids, options['follows'])
+
+            counters.reconcile(fix=True)
+            for user_id in cart_users:
+                shopping_list.rebuild(user_id)
+            update_search_vectors(recipe_ids)
+            versions.bump(versions.TAGS, versions.INGREDIENTS,
+                          versions.RECIPES)
+
+        self.stdout.write(self.style.SUCCESS(
+            'готово за {:.1f} с: пользователей {}, рецептов {}, пароль '
+            '«{}»'.format(time.monotonic() - started, len(user_ids),
+                          len(recipe_ids), PASSWORD)))
+
+    def ensure_ingredients(self, path):
+        if not Ingredient.objects.exists():
+            if not os.path.exists(path):
+                raise CommandError('Файл {} не найден'.format(path))
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = {(row[0].strip(), row[1].strip())
+                        for row in csv.reader(file) if len(row) >= 2}
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, unit=unit) for name, unit in rows],
+                ignore_conflicts=True)
+
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def ensure_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color_code=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS)
+
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, total):
+        offset = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        password = make_password(PASSWORD)
+        for batch in batched(range(offset, offset + total)):
+            User.objects.bulk_create(
+                User(username='{}{}'.format(USERNAME_PREFIX, number),
+                     email='{}{}@bench.local'.format(USERNAME_PREFIX, number),
+                     first_name='Bench', last_name=str(number),
+                     password=password, role=User.USER_ROLE)
+                for number in batch)
+
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('id').values_list(
+            'id', flat=True))[offset:]
+
+    def create_recipes(self, rng, user_ids, total, ingredient_ids, tag_ids):
+        # A few prolific authors and staple ingredients, like real data.
+        author_weights = pareto_weights(len(user_ids), rng)
+        ingredient_pool = ingredient_ids[:]
+        rng.shuffle(ingredient_pool)
+        ingredient_weights = zipf_weights(len(ingredient_pool))
+        tag_weights = zipf_weights(len(tag_ids))
+
+        recipe_ids = []
+        for batch in batched(range(total)):
+            authors = rng.choices(user_ids, cum_weights=author_weights,
+                                  k=len(batch))
+            recipes = [
+                Recipe(author_id=author_id,
+                       name='{} {}'.format(rng.choice(WORDS).capitalize(),
+                                           number),
+                       text=' '.join(rng.choices(WORDS, k=30)),
+                       cooking_time=rng.randint(5, 180))
+                for author_id, number in zip(authors, batch)]
+            Recipe.objects.bulk_create(recipes)
+            ids = list(Recipe.objects.order_by('-id').values_list(
+                'id', flat=True)[:len(recipes)])
+            recipe_ids.extend(ids)
+
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in ids
+                for tag_id in sample_distinct(rng, tag_ids, tag_weights,
+                                              rng.randint(1, 3)))
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe_id=recipe_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=rng.randint(1, 50) * 10)
+                for recipe_id in ids
+                for ingredient_id in sample_distinct(
+                    rng, ingredient_pool, ingredient_weights,
+                    rng.randint(3, 12)))
+            self.stdout.write('рецептов: {}'.format(len(recipe_ids)))
+
+        return recipe_ids
+
+    def create_links(self, rng, model, user_ids, recipe_ids, mean):
+        if not recipe_ids or mean <= 0:
+            return []
+
+        recipe_weights = zipf_weights(len(recipe_ids))
+        linked_users = []
+        links = []
+        for user_id in user_ids:
+            size = int(rng.expovariate(1 / mean))
+            if not size:
+                continue
+            linked_users.append(user_id)
+            links.extend(model(user_id=user_id, recipe_id=recipe_id)
+                         for recipe_id in sample_distinct(
+                             rng, recipe_ids, recipe_weights, size))
+
+        for batch in batched(links):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write('{}: {}'.format(model._meta.model_name,
+                                          len(links)))
+        return linked_users
+
+    def create_follows(self, rng, user_ids, mean):
+        if len(user_ids) < 2 or mean <= 0:
+            return
+
+        # Power-law fan-out: most users have a handful of followers and a
+        # few are followed by a large share of everyone.
+        popularity = pareto_weights(len(user_ids), rng, alpha=1.0)
+        follows = []
+        for user_id in user_ids:
+            size = min(int(rng.expovariate(1 / mean)), len(user_ids) - 1)
+            authors = sample_distinct(rng, user_ids, popularity, size + 1)
+            authors.discard(user_id)
+            follows.extend(Follower(user_id=user_id, author_id=author_id)
+                           for author_id in list(authors)[:size])
+
+        for batch in batched(follows):
+            Follower.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write('подписок: {}'.format(len(follows)))
@@ -0,0 +1,106 @@
+"""Prometheus metrics for the API.
+
+Metrics are plain prometheus_client objects: to add one, declare a
+Counter or Histogram at module level (here or next to the code that
+updates it) and update it from app code. When PROMETHEUS_MULTIPROC_DIR
+is set, every gunicorn worker writes its samples to that directory and
+/metrics sums them up, so one scrape covers all workers.
+
+/metrics wants `Authorization: Bearer <METRICS_TOKEN>`. Without a token
+it only answers direct requests from loopback and private addresses;
+anything that came through the proxy is refused.
+"""
+import ipaddress
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS)
+REQUEST_ERRORS = Counter(
+    'foodgram_request_errors_total',
+    'Ответы с кодом 4xx и 5xx',
+    ['view', 'status'])
+DB_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов на запрос',
+    ['view'],
+    buckets=QUERY_BUCKETS)
+DB_TIME = Histogram(
+    'foodgram_request_db_seconds',
+    'Суммарное время SQL на запрос',
+    ['view'],
+    buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам; доля попаданий = hit / (hit + miss)',
+    ['cache', 'result'])
+
+
+def view_label(request):
+    """`RecipeViewSet.list`, `ShoppingCartView.get` and so on."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name or 'other'
+
+    actions = getattr(match.func, 'actions', None) or {}
+    method = request.method.lower()
+    return '{}.{}'.format(view_class.__name__, actions.get(method, method))
+
+
+def observe_request(request, response, stats, timings):
+    view = view_label(request)
+    REQUEST_LATENCY.labels(view, request.method).observe(timings['total'])
+    DB_QUERIES.labels(view).observe(stats.queries)
+    DB_TIME.labels(view).observe(timings['db'])
+    if response.status_code >= 400:
+        REQUEST_ERRORS.labels(view, str(response.status_code)).inc()
+
+
+def count_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def is_internal(request):
+    if ('HTTP_X_FORWARDED_FOR' in request.META
+            or 'HTTP_X_REAL_IP' in request.META):
+        return False
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return address.is_private or address.is_loopback
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = request.META.get(
+            'HTTP_AUTHORIZATION') == 'Bearer {}'.format(token)
+    else:
+        allowed = is_internal(request)
+    if not allowed:
+        return HttpResponse(status=403)
+
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
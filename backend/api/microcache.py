@@ -0,0 +1,101 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .catalogue import renders_plain_json
+from .metrics import count_cache
+
+WAIT_STEP = 0.02
+
+
+class MicrocacheMixin:
+    """Short-lived cache of rendered responses for anonymous reads.
+
+    Entries are keyed by the `microcache_stamp` version stamp, so any
+    write that bumps it invalidates them at once; it should move only on
+    writes that change what anonymous readers see. Within a version an
+    entry is fresh for MICROCACHE_TTL seconds and may be served stale
+    for MICROCACHE_STALE_TTL more while one request, holding a lock
+    taken with cache.add, recomputes it. On a miss the other requests
+    wait up to MICROCACHE_WAIT_MS for that one instead of all hitting
+    the database. Entries and locks live in the MICROCACHE_ALIAS cache,
+    shared by the workers, so the lock holds across processes.
+    ConditionalGetMixin must come first in the bases.
+    """
+    microcache_stamp = None
+
+    @property
+    def microcache(self):
+        return caches[settings.MICROCACHE_ALIAS]
+
+    def get_microcache_key(self, request):
+        query = sorted((name, sorted(values))
+                       for name, values in request.GET.lists())
+        # The cached bodies hold absolute image URLs.
+        parts = [type(self).__name__, self.action,
+                 request.build_absolute_uri('/'), request.path, repr(query)]
+        return 'microcache:{}:{}:{}'.format(
+            self.microcache_stamp, self.stamps[self.microcache_stamp][0],
+            hashlib.sha1('|'.join(parts).encode()).hexdigest())
+
+    def microcached(self, request, handler, *args, **kwargs):
+        if (not settings.MICROCACHE_TTL or request.user.is_authenticated
+                or not renders_plain_json(request)):
+            return handler(request, *args, **kwargs)
+
+        cache = self.microcache
+        key = self.get_microcache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            entry = self.wait_for_entry(key)
+        if entry is not None and entry[0] > time.time():
+            count_cache('recipe_microcache', True)
+            return self.cached_response(entry)
+
+        count_cache('recipe_microcache', False)
+        lock = key + ':lock'
+        if not cache.add(lock, 1, settings.MICROCACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                return self.cached_response(entry)
+            return handler(request, *args, **kwargs)
+
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                content = (JSONRenderer().render(response.data)
+                           if isinstance(response, Response)
+                           else response.content)
+                entry = (time.time() + settings.MICROCACHE_TTL, content)
+                cache.set(key, entry, settings.MICROCACHE_TTL
+                          + settings.MICROCACHE_STALE_TTL)
+                return self.cached_response(entry)
+            return response
+        finally:
+            cache.delete(lock)
+
+    def wait_for_entry(self, key):
+        """A missing entry that another request is computing."""
+        cache = self.microcache
+        deadline = time.monotonic() + settings.MICROCACHE_WAIT_MS / 1000
+        while cache.get(key + ':lock') and time.monotonic() < deadline:
+            time.sleep(WAIT_STEP)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+
+        return None
+
+    def cached_response(self, entry):
+        return HttpResponse(entry[1], content_type=JSONRenderer.media_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.microcached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.microcached(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,201 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+EXACT_COUNT_THRESHOLD = 1000
+
+
+def estimate_count(queryset):
+    """Row count from the PostgreSQL planner instead of COUNT(*).
+
+    Small estimates are re-checked with an exact count, where it is cheap
+    and the planner is least accurate. Other backends always count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count()
+
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+def encode_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def after(ordering, position):
+    """Rows strictly after `position` in `ordering`.
+
+    This is the row comparison (a, b) < (x, y), written out as
+    a <= x AND (a < x OR a = x AND b < y) because Django has no tuple
+    lookups. The bound on the leading column keeps its index usable.
+    """
+    condition = None
+    for name, value in reversed(list(zip(ordering, position))):
+        field = name.lstrip('-')
+        beyond = Q(**{'{}__{}'.format(
+            field, 'lt' if name.startswith('-') else 'gt'): value})
+        condition = (beyond if condition is None
+                     else beyond | Q(**{field: value}) & condition)
+
+    first = ordering[0]
+    return Q(**{'{}__{}'.format(
+        first.lstrip('-'), 'lte' if first.startswith('-') else 'gte'):
+        position[0]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on every field of `ordering`.
+
+    The cursor holds the values of all ordering fields of the row it
+    points at, so rows sharing a `pub_date` are neither skipped nor
+    repeated when others are inserted meanwhile. The last field must be
+    unique.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering, page_size, page_size_query_param,
+                 max_page_size):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.page_size_query_param = page_size_query_param
+        self.max_page_size = max_page_size
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return (min(page_size, self.max_page_size) if page_size > 0
+                else self.page_size)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, values)]
+            return position, bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        values = [encode_value(row[name.lstrip('-')] if isinstance(row, dict)
+                               else getattr(row, name.lstrip('-')))
+                  for name in self.ordering]
+        cursor = {'p': values}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(name[1:] if name.startswith('-') else '-' + name
+                             for name in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(after(ordering, position))
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next = (self.encode_cursor(rows[-1], False)
+                     if rows and has_next else None)
+        self.previous = (self.encode_cursor(rows[0], True)
+                         if rows and has_previous else None)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next),
+            ('previous', self.previous),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(PageNumberPagination):
+    """Page-number pagination with two opt-in modes for long feeds.
+
+    `?pagination=cursor` (or any request carrying `cursor`) switches to
+    keyset pagination over `cursor_ordering`, which needs no COUNT and no
+    OFFSET. `?count=estimate` keeps page numbers but reports the planner's
+    row estimate as `count`.
+    """
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_page_size_query_param = 'limit'
+    cursor_max_page_size = 100
+
+    def get_cursor_paginator(self):
+        return KeysetPagination(self.cursor_ordering, self.page_size,
+                                self.cursor_page_size_query_param,
+                                self.cursor_max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (request.query_params.get('pagination') == 'cursor'
+                or KeysetPagination.cursor_query_param
+                in request.query_params):
+            self.cursor_paginator = self.get_cursor_paginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+
+        if request.query_params.get('count') == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class SubscriptionsPagination(FeedPagination):
+    cursor_ordering = ('id',)
@@ -0,0 +1,18 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that adds its own run time to the request stats."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        finally:
+            request = (renderer_context or {}).get('request')
+            stats = getattr(request, 'stats', None)
+            if stats is not None:
+                stats.render_time += time.perf_counter() - started
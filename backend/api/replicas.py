@@ -0,0 +1,195 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+POSTGRES_LAG_SQL = ('SELECT COALESCE(EXTRACT(EPOCH FROM now() - '
+                    'pg_last_xact_replay_timestamp()), 0)')
+
+_state = threading.local()
+_health = {}
+_monitor = {'pid': None}
+_monitor_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+def check_replica(alias):
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG_SQL)
+                lag = cursor.fetchone()[0]
+            else:
+                cursor.execute('SELECT 1')
+                lag = 0
+    except DatabaseError:
+        logger.warning('реплика %s недоступна', alias, exc_info=True)
+        return False
+    finally:
+        connection.close()
+
+    if lag > settings.REPLICA_MAX_LAG_SECONDS:
+        logger.warning('реплика %s отстаёт на %.0f с', alias, lag)
+        return False
+
+    return True
+
+
+def refresh_health():
+    for alias in replica_aliases():
+        _health[alias] = check_replica(alias)
+
+
+def monitor():
+    while True:
+        refresh_health()
+        time.sleep(settings.REPLICA_HEALTH_INTERVAL)
+
+
+def start_monitor():
+    """Start the health checks of this process, once per process.
+
+    They run in a daemon thread every REPLICA_HEALTH_INTERVAL seconds,
+    so a slow or unreachable replica never delays a request; until the
+    first round is done reads stay on the primary.
+    """
+    if _monitor['pid'] == os.getpid():
+        return
+
+    with _monitor_lock:
+        if _monitor['pid'] != os.getpid():
+            # A forked worker inherits the parent's results but not its
+            # thread.
+            _health.clear()
+            threading.Thread(target=monitor, name='replica-health',
+                             daemon=True).start()
+            _monitor['pid'] = os.getpid()
+
+
+def is_healthy(alias):
+    return _health.get(alias, False)
+
+
+def choose_replica():
+    start_monitor()
+    healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Sends reads of replica-eligible requests to one healthy replica.
+
+    Everything else goes to the primary: writes, reads inside a
+    transaction on the primary, reads outside a request (management
+    commands, the job worker) and reads of requests pinned by
+    ReplicaMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (not getattr(_state, 'replica_reads', False)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+
+        if _state.alias is None:
+            _state.alias = choose_replica()
+        return _state.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Allows replica reads for safe requests, with read-your-writes.
+
+    A successful unsafe request keeps the client's reads on the primary
+    for REPLICA_STICKY_SECONDS, so what it just wrote is visible even if
+    the replicas lag behind. Token users are pinned by user id in a
+    shared cache, so the window covers all their clients and workers;
+    everyone gets a cookie as well, which covers signing up and logging
+    in.
+    """
+    key_prefix = 'primary-until:'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @property
+    def cache(self):
+        return caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        safe = request.method in SAFE_METHODS
+        user_id = self.get_user_id(request)
+        _state.replica_reads = safe and not self.is_sticky(request, user_id)
+        _state.alias = None
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica_reads = False
+            _state.alias = None
+
+        if not safe and response.status_code < 400:
+            if user_id is not None:
+                self.cache.set(self.key_prefix + str(user_id), True,
+                               settings.REPLICA_STICKY_SECONDS)
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                str(int(time.time() + settings.REPLICA_STICKY_SECONDS)),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax')
+
+        return response
+
+    def get_user_id(self, request):
+        """Id of the token's user; replica reads are not on yet, so a
+        token missing from the cache is looked up on the primary."""
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != b'token':
+            return None
+
+        try:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(
+                auth[1].decode())
+        except (AuthenticationFailed, UnicodeError):
+            return None
+        return user.pk
+
+    def is_sticky(self, request, user_id):
+        if (user_id is not None
+                and self.cache.get(self.key_prefix + str(user_id))):
+            return True
+
+        try:
+            until = int(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE,
+                                            0))
+        except ValueError:
+            return False
+
+        return until > time.time()
@@ -0,0 +1,186 @@
+"""Read-only rendering of tags, ingredients and recipes from .values() rows.
+
+Builds the same data as TagSerializer, IngredientSerializer and
+RecipeReadSerializer without creating model instances or serializer
+fields per object. The bench_serialization command checks that the
+rendered JSON stays byte-identical to the serializers.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from foodgram.models import IngredientInRecipe, Recipe
+from user.models import Follower, User
+
+TAG_FIELDS = ('id', 'name', 'color_code', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'unit')
+RECIPE_FIELDS = ('id', 'author_id', 'name', 'image', 'image_thumbnail',
+                 'image_webp', 'image_thumbnail_webp', 'image_placeholder',
+                 'text', 'cooking_time', 'pub_date', 'favourites_count',
+                 'shopping_cart_count')
+RECIPE_ANNOTATIONS = ('is_favorited', 'is_in_shopping_cart')
+
+format_datetime = serializers.DateTimeField().to_representation
+
+
+def tag(row):
+    return {'id': row['id'], 'name': row['name'],
+            'color': row['color_code'], 'slug': row['slug']}
+
+
+def tags(rows, request=None):
+    return [tag(row) for row in rows]
+
+
+def ingredients(rows, request=None):
+    return [{'id': row['id'], 'name': row['name'], 'unit': row['unit']}
+            for row in rows]
+
+
+def file_url(request):
+    """What ImageField and ImageVariantsMixin output for a stored name."""
+    if request is None:
+        return lambda name: default_storage.url(name) if name else None
+
+    return lambda name: (request.build_absolute_uri(default_storage.url(name))
+                         if name else None)
+
+
+def recipe_tags(recipe_ids):
+    by_recipe = defaultdict(list)
+    for recipe_id, tag_id, name, color, slug in (
+            Recipe.tags.through.objects
+            .filter(recipe_id__in=recipe_ids)
+            .order_by('tag_id')
+            .values_list('recipe_id', 'tag_id', 'tag__name',
+                         'tag__color_code', 'tag__slug')):
+        by_recipe[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug})
+
+    return by_recipe
+
+
+def recipe_ingredients(recipe_ids):
+    by_recipe = defaultdict(list)
+    for recipe_id, ingredient_id, name, unit, amount in (
+            IngredientInRecipe.objects
+            .filter(recipe_id__in=recipe_ids)
+            .order_by('id')
+            .values_list('recipe_id', 'ingredient_id', 'ingredient__name',
+                         'ingredient__unit', 'amount')):
+        by_recipe[recipe_id].append(
+            {'id': ingredient_id, 'name': name, 'measurement_unit': unit,
+             'amount': amount})
+
+    return by_recipe
+
+
+def authors(author_ids, user):
+    queryset = User.objects.filter(pk__in=author_ids)
+    fields = ['id', 'email', 'username', 'first_name', 'last_name']
+    if user is not None and user.is_authenticated:
+        queryset = queryset.annotate(is_subscribed=Exists(
+            Follower.objects.filter(user=user, author=OuterRef('pk'))))
+        fields.append('is_subscribed')
+
+    return {row['id']: {'email': row['email'], 'id': row['id'],
+                        'username': row['username'],
+                        'first_name': row['first_name'],
+                        'last_name': row['last_name'],
+                        'is_subscribed': row.get('is_subscribed', False)}
+            for row in queryset.values(*fields)}
+
+
+def recipes(rows, request, user=None):
+    """RecipeReadSerializer(many=True) for rows of recipe_values().
+
+    `user`, request.user by default, is who `is_subscribed` is for.
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    if not recipe_ids:
+        return []
+
+    if user is None:
+        user = getattr(request, 'user', None)
+    url = file_url(request)
+    tags_by_recipe = recipe_tags(recipe_ids)
+    ingredients_by_recipe = recipe_ingredients(recipe_ids)
+    authors_by_id = authors({row['author_id'] for row in rows}, user)
+
+    return [{
+        'id': row['id'],
+        'tags': tags_by_recipe[row['id']],
+        'ingredients': ingredients_by_recipe[row['id']],
+        'is_favorited': row.get('is_favorited', False),
+        'is_in_shopping_cart': row.get('is_in_shopping_cart', False),
+        'author': authors_by_id[row['author_id']],
+        'name': row['name'],
+        'image': url(row['image']),
+        'image_variants': {
+            'thumbnail': url(row['image_thumbnail']),
+            'webp': url(row['image_webp']),
+            'thumbnail_webp': url(row['image_thumbnail_webp']),
+            'placeholder': row['image_placeholder'] or None,
+        },
+        'text': row['text'],
+        'cooking_time': row['cooking_time'],
+        'pub_date': format_datetime(row['pub_date']),
+        'favourites_count': row['favourites_count'],
+        'shopping_cart_count': row['shopping_cart_count'],
+    } for row in rows]
+
+
+def recipe_values(queryset):
+    annotations = [name for name in RECIPE_ANNOTATIONS
+                   if name in queryset.query.annotations]
+    return queryset.prefetch_related(None).values(
+        *RECIPE_FIELDS, *annotations)
+
+
+class ValuesReadMixin:
+    """list and retrieve rendered by `represent_rows` from .values() rows.
+
+    `represent_rows(rows, request)` is one of tags, ingredients or
+    recipes above. The view's queryset and filters are used as they are;
+    `get_values` turns the queryset into rows. Object permissions are not
+    checked, so only use it on views whose reads are open at object level.
+    FAST_SERIALIZATION = False falls back to the serializer.
+    """
+    values_fields = ()
+    represent_rows = None
+
+    def get_values(self, queryset):
+        return queryset.values(*self.values_fields)
+
+    def represent(self, rows):
+        assert self.represent_rows is not None, (
+            "'{}' should set `represent_rows`.".format(
+                self.__class__.__name__))
+        return self.represent_rows(rows, self.request)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.get_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.represent(page))
+
+        return Response(self.represent(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_values(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(self.represent([row])[0])
@@ -0,0 +1,240 @@
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+
+from .metrics import count_cache
+from foodgram import versions
+from foodgram.models import Ingredient, Recipe
+
+NGRAM_SIZE = 3
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+WORD = re.compile(r'\w+')
+ENDING = re.compile(
+    r'(ами|ями|ого|его|ому|ему|ыми|ими|ой|ей|ий|ый|ая|яя|ое|ее|ые|ие|'
+    r'ам|ям|ах|ях|ов|ев|ом|ем|а|я|о|е|ы|и|у|ю|ь|й)$')
+
+
+def fold(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def ngrams(text):
+    return {text[i:i + NGRAM_SIZE]
+            for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class IngredientIndex:
+    """Prefix/substring index over ingredient names kept in process memory.
+
+    Rows are stored sorted by folded name, so a prefix lookup is a binary
+    search and substring candidates come from trigram posting lists.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (fold(row['name']), row['id']))
+        self.rows = rows
+        self.keys = [fold(row['name']) for row in rows]
+        postings = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for gram in ngrams(key):
+                postings[gram].append(position)
+        self.postings = dict(postings)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query, limit):
+        query = fold(query.strip())
+        if not query:
+            return self.rows[:limit]
+
+        start = bisect_left(self.keys, query)
+        end = start
+        while (end < len(self.keys) and end - start < limit
+               and self.keys[end].startswith(query)):
+            end += 1
+        positions = list(range(start, end))
+
+        if len(positions) < limit:
+            for position in self.substring_positions(query):
+                if position < start or position >= end:
+                    positions.append(position)
+                    if len(positions) >= limit:
+                        break
+
+        return [self.rows[position] for position in positions]
+
+    def substring_positions(self, query):
+        if len(query) < NGRAM_SIZE:
+            return (position for position, key in enumerate(self.keys)
+                    if query in key)
+
+        lists = sorted((self.postings.get(gram, ()) for gram in ngrams(query)),
+                       key=len)
+        candidates = set(lists[0])
+        for other in lists[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                break
+
+        return (position for position in sorted(candidates)
+                if query in self.keys[position])
+
+
+_index = (None, None)
+_lock = threading.Lock()
+
+
+def build_ingredient_index(version=None):
+    global _index
+    if version is None:
+        version = versions.get_stamps(
+            versions.INGREDIENTS)[versions.INGREDIENTS][0]
+    index = IngredientIndex(Ingredient.objects.values('id', 'name', 'unit'))
+    with _lock:
+        _index = (version, index)
+
+    return index
+
+
+def get_ingredient_index(version):
+    """In-process index for ingredients stamp `version`, rebuilt whenever
+    the stamp has moved since it was built."""
+    built_for, index = _index
+    count_cache('ingredient_index', index is not None and built_for == version)
+    if index is None or built_for != version:
+        return build_ingredient_index(version)
+
+    return index
+
+
+def stem(word):
+    stemmed = ENDING.sub('', word)
+    return stemmed if len(stemmed) >= 3 else word
+
+
+def words(text):
+    return [stem(word) for word in WORD.findall(fold(text))]
+
+
+class RecipeIndex:
+    """Inverted index over recipe names and texts for databases without
+    full-text search.
+
+    Terms get a crude Russian suffix strip and query terms match as
+    prefixes, which approximates tsvector stemming closely enough for
+    test runs. Names weigh more than texts, as with weights A and B.
+    """
+
+    def __init__(self, rows):
+        postings = defaultdict(lambda: defaultdict(float))
+        self.size = 0
+        for recipe_id, name, text in rows:
+            self.size += 1
+            for weight, field in ((NAME_WEIGHT, name), (TEXT_WEIGHT, text)):
+                for term in words(field):
+                    postings[term][recipe_id] += weight
+        self.postings = {term: dict(ids) for term, ids in postings.items()}
+        self.terms = sorted(self.postings)
+
+    def matches(self, prefix):
+        found = defaultdict(float)
+        position = bisect_left(self.terms, prefix)
+        while (position < len(self.terms)
+               and self.terms[position].startswith(prefix)):
+            for recipe_id, weight in self.postings[
+                    self.terms[position]].items():
+                found[recipe_id] += weight
+            position += 1
+
+        return found
+
+    def search(self, query, limit):
+        """Return [(recipe_id, rank)] of recipes matching every term."""
+        scores = None
+        for term in set(words(query)):
+            found = self.matches(term)
+            idf = math.log(1 + self.size / (1 + len(found)))
+            if scores is None:
+                scores = {recipe_id: 0.0 for recipe_id in found}
+            for recipe_id in list(scores):
+                if recipe_id in found:
+                    scores[recipe_id] += (1 + math.log(found[recipe_id])
+                                          ) * idf
+                else:
+                    del scores[recipe_id]
+
+        if not scores:
+            return []
+
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+
+_recipe_index = (None, None)
+_recipe_lock = threading.Lock()
+
+
+def get_recipe_index():
+    """Fallback index, rebuilt whenever the recipes stamp moves."""
+    global _recipe_index
+    version = versions.get_stamps(versions.RECIPES)[versions.RECIPES][0]
+    built_for, index = _recipe_index
+    count_cache('recipe_index', index is not None and built_for == version)
+    if index is None or built_for != version:
+        index = RecipeIndex(
+            Recipe.objects.values_list('id', 'name', 'text').iterator())
+        with _recipe_lock:
+            _recipe_index = (version, index)
+
+    return index
+
+
+def recipe_search_vector():
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config))
+
+
+def update_search_vectors(recipe_ids):
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=recipe_search_vector())
+
+
+def update_recipe_search_vector(sender, instance, update_fields=None,
+                                **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        update_search_vectors([instance.pk])
+
+
+def search_recipes(queryset, query):
+    """Filter `queryset` to recipes matching `query`, best match first.
+
+    Stays a single query, so it combines with the other RecipeFilter
+    fields and with pagination.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query,
+                                   config=settings.RECIPE_SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query))
+    else:
+        hits = get_recipe_index().search(
+            query, settings.RECIPE_SEARCH_FALLBACK_LIMIT)
+        queryset = queryset.filter(
+            pk__in=[recipe_id for recipe_id, _ in hits]).annotate(
+            search_rank=Case(
+                *[When(pk=recipe_id, then=Value(rank))
+                  for recipe_id, rank in hits],
+                default=Value(0.0), output_field=FloatField()))
+
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -1,10 +1,15 @@
-from drf_extra_fields.fields import Base64ImageField
+import json
+
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueValidator
 
+from .fields import LimitedBase64ImageField
 from .utils import get_user_from_serializer_context
+from foodgram import images, shopping_list
 from foodgram.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from jobs.models import Job
 from user.models import Follower, User
 
 
@@ -28,6 +33,9 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def _is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+
         current_user = get_user_from_serializer_context(self)
         if (current_user is not None
                 and not current_user.is_anonymous
@@ -79,17 +87,31 @@ class IngredientInRecipeWriteSerializer(serializers.ModelSerializer):
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all())
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientInRecipeWriteSerializer(
         source="ingredientinrecipe_set", many=True)
-    image = Base64ImageField()
+    image = LimitedBase64ImageField()
+
+    def find_tags(self, ids):
+        return set(Tag.objects.filter(id__in=ids).values_list(
+            'id', flat=True))
+
+    def find_ingredients(self, ids):
+        return set(Ingredient.objects.filter(id__in=ids).values_list(
+            'id', flat=True))
 
     def validate_tags(self, data):
         if not data:
             raise ValidationError('Добавьте хотя бы один тэг')
 
-        return data
+        ids = list(dict.fromkeys(data))
+        found = self.find_tags(ids)
+        missing = [tag_id for tag_id in ids if tag_id not in found]
+        if missing:
+            raise ValidationError(
+                'Тэги не найдены: {}'.format(', '.join(map(str, missing))))
+
+        return ids
 
     def validate_ingredients(self, data):
         if not data:
@@ -106,6 +128,13 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
             ids.append(ingredient['ingredient']['id'])
 
+        found = self.find_ingredients(ids)
+        missing = [ingredient_id for ingredient_id in ids
+                   if ingredient_id not in found]
+        if missing:
+            raise ValidationError('Ингредиенты не найдены: {}'.format(
+                ', '.join(map(str, missing))))
+
         return data
 
     def validate_cooking_time(self, data):
@@ -115,13 +144,36 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return data
 
-    def create_ingredient_in_recipe(self, ingredients, recipe):
-        for ingredient in ingredients:
-            IngredientInRecipe.objects.get_or_create(
-                ingredient_id=ingredient['ingredient']['id'],
-                amount=ingredient['amount'],
-                recipe=recipe)
-
+    def get_amounts(self, ingredients):
+        return {ingredient['ingredient']['id']: ingredient['amount']
+                for ingredient in ingredients}
+
+    def write_ingredients(self, recipe, amounts, existing=None):
+        """Bring the recipe's IngredientInRecipe rows to `amounts`.
+
+        Only rows that are new, removed or whose amount changed are
+        written: one INSERT, one UPDATE and one DELETE at most.
+        """
+        existing = existing or {}
+        IngredientInRecipe.objects.filter(pk__in=[
+            row.pk for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts]).delete()
+
+        changed = []
+        for ingredient_id, row in existing.items():
+            if (ingredient_id in amounts
+                    and row.amount != amounts[ingredient_id]):
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                               amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = []
         if 'ingredientinrecipe_set' in validated_data:
@@ -129,21 +181,37 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         recipe = super().create(validated_data)
 
-        self.create_ingredient_in_recipe(ingredients, recipe)
+        self.write_ingredients(recipe, self.get_amounts(ingredients))
+        images.schedule_variants(recipe)
 
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
+        shopping_list.lock_recipe(recipe.pk)
         ingredients = []
         if 'ingredientinrecipe_set' in validated_data:
             ingredients = validated_data.pop('ingredientinrecipe_set')
 
+        if 'image' in validated_data:
+            images.delete_files_on_commit(recipe)
+            images.clear_variants(recipe)
+
         recipe = super().update(recipe, validated_data)
 
-        if len(ingredients) > 0:
-            IngredientInRecipe.objects.filter(recipe=recipe).delete()
+        if 'image' in validated_data:
+            images.schedule_variants(recipe)
 
-            self.create_ingredient_in_recipe(ingredients, recipe)
+        if len(ingredients) > 0:
+            existing = {
+                row.ingredient_id: row
+                for row in IngredientInRecipe.objects.filter(recipe=recipe)}
+            old_amounts = {ingredient_id: row.amount
+                           for ingredient_id, row in existing.items()}
+            new_amounts = self.get_amounts(ingredients)
+            if new_amounts != old_amounts:
+                self.write_ingredients(recipe, new_amounts, existing)
+                shopping_list.change_recipe(recipe, old_amounts, new_amounts)
 
         return recipe
 
@@ -152,39 +220,76 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         model = Recipe
 
     def to_representation(self, instance):
+        view = self.context.get('view')
+        if view is not None and hasattr(view, 'get_queryset'):
+            instance = view.get_queryset().get(pk=instance.pk)
+
         return RecipeReadSerializer(instance, context=self.context).data
 
 
 class AuthorWithRecipesSerializer(UserSerializer):
     DEFAULT_RECIPES_LIMIT = 3
+    MAX_RECIPES_LIMIT = 20
 
     recipes = serializers.SerializerMethodField('_recipes')
-    recipes_count = serializers.SerializerMethodField('_recipes_count')
 
-    def _recipes(self, user):
-        limit = self.DEFAULT_RECIPES_LIMIT
-        if 'request' in self.context:
-            request = self.context['request']
-            if 'recipes_limit' in request.GET:
-                limit = int(request.GET['recipes_limit'])
+    @classmethod
+    def get_recipes_limit(cls, request):
+        if request is None or 'recipes_limit' not in request.GET:
+            return cls.DEFAULT_RECIPES_LIMIT
 
-        return RecipeMinifiedSerializer(
-            user.recipes.all()[:limit],
-            many=True).data
+        try:
+            limit = int(request.GET['recipes_limit'])
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым неотрицательным числом'})
 
-    def _recipes_count(self, user):
-        return user.recipes.count()
+        return min(limit, cls.MAX_RECIPES_LIMIT)
+
+    def _recipes(self, user):
+        if 'recipe_previews' in self.context:
+            recipes = self.context['recipe_previews'].get(user.pk, [])
+        else:
+            limit = self.get_recipes_limit(self.context.get('request'))
+            recipes = user.recipes.all()[:limit]
+
+        return RecipeMinifiedSerializer(recipes, many=True).data
 
     class Meta:
         model = User
         fields = ['email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count']
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count']
+
+
+class ImageVariantsMixin(serializers.Serializer):
+    image_variants = serializers.SerializerMethodField('_image_variants')
 
+    def _image_variants(self, recipe):
+        request = self.context.get('request')
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+        def url(file):
+            if not file:
+                return None
+            if request is not None:
+                return request.build_absolute_uri(file.url)
+            return file.url
+
+        return {
+            'thumbnail': url(recipe.image_thumbnail),
+            'webp': url(recipe.image_webp),
+            'thumbnail_webp': url(recipe.image_thumbnail_webp),
+            'placeholder': recipe.image_placeholder or None,
+        }
+
+
+class RecipeMinifiedSerializer(ImageVariantsMixin,
+                               serializers.ModelSerializer):
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_variants', 'cooking_time']
 
 
 class IngredientInRecipeReadSerializer(serializers.ModelSerializer):
@@ -197,7 +302,7 @@ class IngredientInRecipeReadSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = IngredientInRecipeReadSerializer(
         many=True, source='ingredientinrecipe_set')
@@ -207,6 +312,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserSerializer()
 
     def _is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
+
         current_user = get_user_from_serializer_context(self)
         if (current_user is not None
                 and not current_user.is_anonymous
@@ -217,6 +325,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
     def _is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
+
         current_user = get_user_from_serializer_context(self)
         if (current_user is not None
                 and not current_user.is_anonymous
@@ -228,7 +339,10 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        fields = ['id', 'tags', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'author', 'name', 'image',
+                  'image_variants', 'text', 'cooking_time', 'pub_date',
+                  'favourites_count', 'shopping_cart_count']
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -240,3 +354,16 @@ class IngredientSerializer(serializers.ModelSerializer):
 class ChangePasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField()
     current_password = serializers.CharField()
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts',
+                  'run_at', 'created', 'started', 'finished', 'result',
+                  'error']
+
+    def get_result(self, job):
+        return json.loads(job.result) if job.result else None
@@ -0,0 +1,740 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from backend.postgresql_pool import base as pool_base
+from backend.postgresql_pool.pool import ConnectionPool
+
+from . import replicas, utils
+from .authentication import token_cache
+from .checks import check_shared_caches
+from .filters import RecipeFilter
+from .importer import RecipeImporter
+from .management.commands.bench_serialization import (make_request,
+                                                      recipe_queryset,
+                                                      represented, serialized)
+from .serializers import AuthorWithRecipesSerializer
+from .views import RecipeViewSet, SubscriptionsViewSet
+from foodgram import counters, versions
+from foodgram.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from jobs import queue
+from user.models import Follower, User
+
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe'
+       'AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC')
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email='{}@foodgram.test'.format(username),
+        password='password', first_name=username.title(), last_name='Тест')
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт {}'.format(number),
+            text='Описание', cooking_time=number + 1)
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        for position, ingredient in enumerate(ingredients[:3]):
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient,
+                amount=position + number)
+        recipes.append(recipe)
+
+    return recipes
+
+
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-' + alias}
+    for alias in ('default', 'shared')
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FoodgramTestCase(TestCase):
+    """Authors, a reader with favourites, cart and subscription, and
+    recipes with tags and ingredients."""
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.other_author = create_user('other')
+        cls.reader = create_user('reader')
+        cls.tags = [Tag.objects.create(name='Тэг {}'.format(number),
+                                       color_code='00ff0{}'.format(number),
+                                       slug='tag{}'.format(number))
+                    for number in range(3)]
+        cls.ingredients = [Ingredient.objects.create(
+            name='Ингредиент {}'.format(number), unit='г')
+            for number in range(5)]
+        cls.recipes = (
+            create_recipes(cls.author, cls.recipes_count, cls.tags,
+                           cls.ingredients)
+            + create_recipes(cls.other_author, 1, cls.tags,
+                             cls.ingredients))
+        Favourite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[1])
+        Follower.objects.create(user=cls.reader, author=cls.author)
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        # Kept per process like the caches; the tags stamp version repeats
+        # between test classes while the tag ids may not.
+        registry = mock.patch.object(utils, '_tag_registry', (None, None))
+        registry.start()
+        self.addCleanup(registry.stop)
+        # Test requests routinely run over the budgets; keep their log
+        # lines out of the test output.
+        request_logger = logging.getLogger('api.instrumentation')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.ERROR)
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+                Token.objects.get(user=user).key))
+        return client
+
+
+@override_settings(MICROCACHE_TTL=0)
+class RecipeQueryCountTests(FoodgramTestCase):
+    """Recipe list and detail cost the same number of queries whatever
+    the number of recipes on the page."""
+
+    def check_queries(self, queries, user, path):
+        client = self.client_for(user)
+        for count in (3, 10):
+            with self.subTest(recipes=count, user=user, path=path):
+                create_recipes(self.author, count - Recipe.objects.filter(
+                    author=self.author).count(), self.tags, self.ingredients)
+                self.setUp()
+                with self.assertNumQueries(queries):
+                    response = client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def detail_path(self):
+        return '/api/recipes/{}/'.format(self.recipes[0].pk)
+
+    @override_settings(FAST_SERIALIZATION=False)
+    def test_serializers(self):
+        # Stamps, count, recipes, then authors, tags and ingredients.
+        self.check_queries(6, None, '/api/recipes/')
+        # Plus the token.
+        self.check_queries(7, self.reader, '/api/recipes/')
+        self.check_queries(5, None, self.detail_path())
+        self.check_queries(6, self.reader, self.detail_path())
+
+    @override_settings(RECIPE_DOCUMENT_TTL=0)
+    def test_values(self):
+        self.check_queries(6, None, '/api/recipes/')
+        self.check_queries(7, self.reader, '/api/recipes/')
+        self.check_queries(5, None, self.detail_path())
+        self.check_queries(6, self.reader, self.detail_path())
+
+    def test_documents(self):
+        for user in (None, self.reader):
+            client = self.client_for(user)
+            for path in ('/api/recipes/', self.detail_path()):
+                with self.subTest(user=user, path=path):
+                    self.setUp()
+                    client.get(path)
+                    # Stamps, count on lists and the page; the token and
+                    # the documents come from the cache.
+                    queries = 1 + (path == '/api/recipes/') + 1
+                    with self.assertNumQueries(queries):
+                        response = client.get(path)
+                    self.assertEqual(response.status_code, 200)
+
+
+@override_settings(MICROCACHE_TTL=0)
+class RepresentationParityTests(FoodgramTestCase):
+    """api.representations renders exactly what the serializers do."""
+    recipes_count = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Recipe.objects.filter(pk=cls.recipes[0].pk).update(
+            image='recipes/photo.png',
+            image_thumbnail='recipes/variants/photo_thumb.jpg',
+            image_webp='recipes/variants/photo.webp',
+            image_placeholder='data:image/jpeg;base64,AAAA')
+        Favourite.objects.create(user=cls.reader, recipe=cls.recipes[-1])
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        Follower.objects.create(user=cls.reader, author=cls.other_author)
+        Token.objects.create(user=cls.other_author)
+
+    def users(self):
+        return [None, self.reader, self.other_author]
+
+    def test_objects(self):
+        renderer = JSONRenderer()
+        for user in self.users():
+            request = make_request(user)
+            for name, queryset in (
+                    ('tags', Tag.objects.order_by('id')),
+                    ('ingredients', Ingredient.objects.order_by('id')),
+                    ('recipes', recipe_queryset(request))):
+                with self.subTest(user=user, name=name):
+                    self.assertEqual(
+                        renderer.render(represented(name, request,
+                                                    queryset.all())),
+                        renderer.render(serialized(name, request,
+                                                   queryset.all())))
+
+    def test_endpoints(self):
+        recipe = self.recipes[0]
+        paths = [
+            ('/api/recipes/', {}),
+            ('/api/recipes/', {'page': 2}),
+            ('/api/recipes/', {'pagination': 'cursor', 'limit': 2}),
+            ('/api/recipes/', {'is_favorited': 1}),
+            ('/api/recipes/', {'is_in_shopping_cart': 1}),
+            ('/api/recipes/', {'tags': self.tags[1].slug}),
+            ('/api/recipes/', {'author': self.other_author.pk}),
+            ('/api/recipes/{}/'.format(recipe.pk), {}),
+            ('/api/tags/', {}),
+            ('/api/tags/{}/'.format(self.tags[0].pk), {}),
+            ('/api/ingredients/', {}),
+            ('/api/ingredients/{}/'.format(self.ingredients[0].pk), {}),
+        ]
+        for user in self.users():
+            client = self.client_for(user)
+            for path, params in paths:
+                # Serializers, values rows, then recipe documents from a
+                # cold and a warm cache.
+                responses = []
+                for options in ({'FAST_SERIALIZATION': False},
+                                {'RECIPE_DOCUMENT_TTL': 0}, {}, {}):
+                    with override_settings(**options):
+                        response = client.get(path, params)
+                    self.assertEqual(response.status_code, 200)
+                    responses.append(response.content)
+                with self.subTest(user=user, path=path, params=params):
+                    for content in responses[1:]:
+                        self.assertEqual(content, responses[0])
+
+    def test_subscriptions(self):
+        create_recipes(self.other_author, 4, self.tags, self.ingredients)
+        client = self.client_for(self.reader)
+        for limit in (None, 0, 1, 4, 30):
+            params = {} if limit is None else {'recipes_limit': limit}
+            response = client.get('/api/users/subscriptions/', params)
+            self.assertEqual(response.status_code, 200)
+
+            # The serializer on its own fetches each author's recipes
+            # instead of using the view's get_latest_recipes.
+            request = make_request(self.reader)
+            request._request.GET = request._request.GET.copy()
+            request._request.GET.update(params)
+            queryset = SubscriptionsViewSet(
+                request=request, format_kwarg=None).get_queryset()
+            expected = AuthorWithRecipesSerializer(
+                queryset, many=True, context={'request': request}).data
+            with self.subTest(recipes_limit=limit):
+                self.assertEqual(
+                    JSONRenderer().render(response.data['results']),
+                    JSONRenderer().render(expected))
+
+
+class IngredientSearchTests(FoodgramTestCase):
+    def search(self, name):
+        response = self.client_for().get('/api/ingredients/',
+                                         {'name': name})
+        return [row['name'] for row in response.json()]
+
+    def test_index_follows_ingredients_stamp(self):
+        self.assertEqual(self.search('ингредиент 1'), ['Ингредиент 1'])
+        Ingredient.objects.create(name='Ингредиент 10', unit='г')
+        self.assertEqual(self.search('ингредиент 1'),
+                         ['Ингредиент 1', 'Ингредиент 10'])
+        Ingredient.objects.filter(name='Ингредиент 10').delete()
+        self.assertEqual(self.search('ингредиент 1'), ['Ингредиент 1'])
+
+
+class CursorPaginationTests(FoodgramTestCase):
+    recipes_count = 7
+
+    def page(self, url, params=None):
+        response = self.client_for().get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_equal_pub_dates(self):
+        pub_date = Recipe.objects.order_by('pub_date').first().pub_date
+        Recipe.objects.update(pub_date=pub_date)
+        expected = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True))
+
+        seen = []
+        pages = []
+        page = self.page('/api/recipes/', {'pagination': 'cursor',
+                                           'limit': 3})
+        while True:
+            pages.append(page)
+            seen += [recipe['id'] for recipe in page['results']]
+            # New recipes at the same instant must not shift the pages.
+            create_recipes(self.author, 1, self.tags, self.ingredients)
+            Recipe.objects.update(pub_date=pub_date)
+            if page['next'] is None:
+                break
+            page = self.page(page['next'])
+        self.assertEqual(seen, expected)
+
+        for previous in reversed(pages[:-1]):
+            page = self.page(page['previous'])
+            self.assertEqual(page['results'], previous['results'])
+        # Before the first page are only the recipes added meanwhile.
+        newer = self.page(page['previous'])
+        self.assertTrue(all(recipe['id'] > expected[0]
+                            for recipe in newer['results']))
+        self.assertEqual(len(newer['results']), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client_for().get('/api/recipes/',
+                                         {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MICROCACHE_TTL=0)
+@mock.patch.object(RecipeViewSet, 'etag_max_age', None)
+class RecipeETagTests(FoodgramTestCase):
+    def etag(self, user=None):
+        return self.client_for(user).get('/api/recipes/')['ETag']
+
+    def test_links_only_change_their_user(self):
+        anonymous, reader = self.etag(), self.etag(self.reader)
+        Token.objects.create(user=self.other_author)
+        etag = self.etag(self.other_author)
+        for link in (Favourite, ShoppingCart):
+            link.objects.create(user=self.other_author,
+                                recipe=self.recipes[2])
+        Follower.objects.create(user=self.other_author, author=self.author)
+
+        self.assertEqual(self.etag(), anonymous)
+        self.assertEqual(self.etag(self.reader), reader)
+        self.assertNotEqual(self.etag(self.other_author), etag)
+
+    def test_author_fields(self):
+        etag = self.etag()
+        self.author.last_login = timezone.now()
+        self.author.save(update_fields=['last_login'])
+        self.author.set_password('changed')
+        self.author.save()
+        self.assertEqual(self.etag(), etag)
+
+        self.author.first_name = 'Другое'
+        self.author.save()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_max_age(self):
+        etag = self.etag()
+        with mock.patch.object(RecipeViewSet, 'etag_max_age', 60):
+            with mock.patch('api.conditional.time.time', return_value=0):
+                first = self.etag()
+            with mock.patch('api.conditional.time.time', return_value=59):
+                self.assertEqual(self.etag(), first)
+            with mock.patch('api.conditional.time.time', return_value=60):
+                self.assertNotEqual(self.etag(), first)
+        self.assertNotEqual(first, etag)
+
+
+@override_settings(MICROCACHE_TTL=5)
+class MicrocacheTests(FoodgramTestCase):
+    def test_shared_and_public_only(self):
+        client = APIClient()
+        content = client.get('/api/recipes/').content
+        caches['default'].clear()
+        # A reader's favourite changes no public field but the counters,
+        # which may lag by MICROCACHE_TTL anyway.
+        Favourite.objects.create(user=self.reader, recipe=self.recipes[2])
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/recipes/').content, content)
+
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(name='Новое')
+        versions.bump(versions.RECIPES)
+        self.assertIn('Новое', client.get('/api/recipes/').json()[
+            'results'][-1]['name'])
+
+    def test_keyed_by_scheme_and_host(self):
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            image='recipes/photo.png')
+        client = APIClient()
+        for secure, host in ((False, 'testserver'), (True, 'testserver'),
+                             (False, 'foodgram.test')):
+            with self.subTest(secure=secure, host=host):
+                image = client.get(
+                    '/api/recipes/', secure=secure, HTTP_HOST=host).json()[
+                    'results'][-1]['image']
+                self.assertTrue(image.startswith('{}://{}/'.format(
+                    'https' if secure else 'http', host)))
+
+
+class CatalogueETagTests(FoodgramTestCase):
+    def get(self, **extra):
+        return self.client.get('/api/tags/', **extra)
+
+    def test_etag_per_coding(self):
+        plain = self.get()
+        gzipped = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzipped['ETag'], plain['ETag'][:-1] + '-gzip"')
+        for response in (plain, gzipped):
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+        for response in (plain, gzipped):
+            revalidated = self.get(HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated['ETag'], response['ETag'])
+
+        versions.bump(versions.TAGS)
+        self.assertEqual(self.get(HTTP_ACCEPT_ENCODING='gzip',
+                                  HTTP_IF_NONE_MATCH=gzipped['ETag'])
+                         .status_code, 200)
+
+
+class TokenCacheTests(FoodgramTestCase):
+    def test_logout_evicts_token(self):
+        client = self.client_for(self.reader)
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+        self.assertEqual(client.post('/api/auth/token/logout/').status_code,
+                         204)
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+    def test_no_password_hash_cached(self):
+        client = self.client_for(self.reader)
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        user, token = token_cache.get(self.token.key)
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertNotIn(User.objects.get(pk=self.reader.pk).password.encode(),
+                         pickle.dumps((user, token)))
+
+        # A cached user still has its password checked and changed.
+        response = client.post('/api/users/set_password/', {
+            'current_password': 'password', 'new_password': 'новый'})
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(User.objects.get(
+            pk=self.reader.pk).check_password('новый'))
+
+    def test_local_cache_rejected(self):
+        self.assertEqual([error.id for error in check_shared_caches(None)],
+                         ['api.E001', 'api.E003'])
+        with override_settings(MICROCACHE_TTL=0):
+            self.assertEqual(
+                [error.id for error in check_shared_caches(None)],
+                ['api.E001'])
+        shared = dict(TEST_CACHES, shared={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/foodgram-test'})
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class RecipeImportTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def document(self, name):
+        return json.dumps({
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'image': PNG, 'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}]})
+
+    def test_bump_per_chunk(self):
+        depth = len(connection.savepoint_ids)
+        bumps = []
+        stamps = mock.Mock(RECIPES=versions.RECIPES)
+        stamps.bump.side_effect = lambda *names: bumps.append(
+            len(connection.savepoint_ids))
+        importer = RecipeImporter(self.author, chunk_size=1)
+        with mock.patch('api.importer.versions', stamps), mock.patch(
+                'api.importer.images.schedule_variants_many',
+                side_effect=[None, OSError('хранилище недоступно')]):
+            with self.assertRaises(OSError):
+                importer.run([self.document('Первый'),
+                              self.document('Второй')])
+
+        # The first chunk was committed with its bump, inside its own
+        # transaction; the failed one left neither rows nor a bump.
+        self.assertEqual(len(bumps), 1)
+        self.assertGreater(bumps[0], depth)
+        self.assertTrue(Recipe.objects.filter(name='Первый').exists())
+        self.assertFalse(Recipe.objects.filter(name='Второй').exists())
+
+    def test_ids_as_strings(self):
+        # RecipeWriteSerializer takes "3" for 3, and so must the lookup.
+        document = json.loads(self.document('Строки'))
+        document['tags'] = [str(self.tags[0].pk)]
+        document['ingredients'][0]['id'] = str(self.ingredients[0].pk)
+        report = RecipeImporter(self.author).run([json.dumps(document)])
+
+        self.assertEqual(report['errors'], [])
+        recipe = Recipe.objects.get(name='Строки')
+        self.assertEqual(list(recipe.tags.all()), [self.tags[0]])
+        self.assertEqual(recipe.ingredientinrecipe_set.get().ingredient,
+                         self.ingredients[0])
+
+    def test_counters_follow_committed_chunks(self):
+        recipes_count = User.objects.get(pk=self.author.pk).recipes_count
+        importer = RecipeImporter(self.author, chunk_size=1)
+        with mock.patch('api.importer.update_search_vectors', side_effect=[
+                None, DatabaseError('сбой записи')]):
+            report = importer.run([self.document('Первый'),
+                                   self.document('Второй')])
+
+        self.assertEqual((report['created'], report['failed']), (1, 1))
+        self.assertEqual(User.objects.get(pk=self.author.pk).recipes_count,
+                         recipes_count + 1)
+        self.assertFalse(any(counters.reconcile(fix=False).values()))
+
+
+class RecipeImageFileTests(FoodgramTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Token.objects.create(user=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.media)
+                      for path, _, names in os.walk(self.media)
+                      for name in names)
+
+    def run_jobs(self):
+        for job in queue.claim('test', limit=10):
+            self.assertTrue(queue.run(job))
+
+    def save(self, method, url):
+        response = getattr(self.client_for(self.author), method)(url, {
+            'name': 'С картинкой', 'text': 'Описание', 'cooking_time': 5,
+            'image': PNG, 'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+        }, format='json')
+        self.assertIn(response.status_code, (200, 201))
+        return response.json()['id']
+
+    def test_replaced_files_deleted(self):
+        pk = self.save('post', '/api/recipes/')
+        self.run_jobs()
+        old = self.stored()
+        self.assertEqual(len(old), 4)
+
+        # TestCase never commits; run the callbacks right away instead.
+        with mock.patch.object(transaction, 'on_commit',
+                               side_effect=lambda func: func()):
+            self.save('patch', '/api/recipes/{}/'.format(pk))
+        self.assertEqual(len(self.stored()), 1)
+        self.run_jobs()
+
+        new = self.stored()
+        self.assertEqual(len(new), 4)
+        self.assertFalse(set(old) & set(new))
+
+
+class BenchmarkCommandTests(FoodgramTestCase):
+    def test_leaves_media_untouched(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        output = os.path.join(media, 'report.json')
+        User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='пароль',
+            first_name='Админ', last_name='Админов')
+        with override_settings(MEDIA_ROOT=media):
+            call_command('seed_bench', users=20, recipes=10, follows=2,
+                         stdout=mock.Mock())
+            call_command('bench_api', iterations=1, warmup=0, output=output,
+                         stdout=mock.Mock())
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+
+        self.assertEqual(os.listdir(media), ['report.json'])
+        self.assertEqual(report['endpoints']['recipes:create']['statuses'],
+                         [201])
+
+
+class MetricsAccessTests(FoodgramTestCase):
+    def status(self, **extra):
+        return self.client.get('/metrics', **extra).status_code
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_without_token(self):
+        self.assertEqual(self.status(REMOTE_ADDR='127.0.0.1'), 200)
+        self.assertEqual(self.status(REMOTE_ADDR='10.0.0.7'), 200)
+        self.assertEqual(self.status(REMOTE_ADDR='93.184.216.34'), 403)
+        self.assertEqual(self.status(REMOTE_ADDR='10.0.0.7',
+                                     HTTP_X_FORWARDED_FOR='93.184.216.34'),
+                         403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_with_token(self):
+        self.assertEqual(self.status(), 403)
+        self.assertEqual(self.status(HTTP_AUTHORIZATION='Bearer secret',
+                                     REMOTE_ADDR='93.184.216.34'), 200)
+
+
+@mock.patch('api.replicas.replica_aliases', return_value=['replica_0'])
+class ReplicaTests(FoodgramTestCase):
+    def replica_reads(self, method, user=None, response_status=200):
+        reads = []
+
+        def get_response(request):
+            reads.append(replicas._state.replica_reads)
+            return HttpResponse(status=response_status)
+
+        extra = {}
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            extra['HTTP_AUTHORIZATION'] = 'Token ' + token.key
+        request = getattr(RequestFactory(), method)('/api/recipes/', **extra)
+        replicas.ReplicaMiddleware(get_response)(request)
+        return reads[0]
+
+    def test_sticky_by_user(self, aliases):
+        self.assertTrue(self.replica_reads('get', self.reader))
+        self.replica_reads('post', self.reader, response_status=400)
+        self.assertTrue(self.replica_reads('get', self.reader))
+
+        self.replica_reads('post', self.reader, response_status=201)
+        # No cookie here: another client of the same user.
+        self.assertFalse(self.replica_reads('get', self.reader))
+        self.assertTrue(self.replica_reads('get', self.author))
+        self.assertTrue(self.replica_reads('get'))
+
+    def test_health_off_request_path(self, aliases):
+        self.addCleanup(replicas._health.clear)
+        with mock.patch('api.replicas.start_monitor'), mock.patch(
+                'api.replicas.check_replica',
+                return_value=True) as check_replica:
+            self.assertEqual(replicas.choose_replica(), 'default')
+            check_replica.assert_not_called()
+
+            replicas.refresh_health()
+            self.assertEqual(replicas.choose_replica(), 'replica_0')
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self):
+        return ConnectionPool(mock.Mock, check=lambda connection: True,
+                              reset=lambda connection: True, max_size=2)
+
+    def test_reuses_returned_connection(self):
+        pool = self.make_pool()
+        connection = pool.get()
+        pool.put(connection)
+        self.assertIs(pool.get(), connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_close_inside_atomic_discards(self):
+        pool = self.make_pool()
+        for in_atomic_block in (False, True):
+            connection = pool.get()
+            wrapper = mock.MagicMock(connection=connection, pool=pool,
+                                     in_atomic_block=in_atomic_block)
+            pool_base.DatabaseWrapper._close(wrapper)
+
+        # The first connection went back to the pool and was taken again,
+        # then closed for good instead of being handed out once more.
+        connection.close.assert_called_once_with()
+        self.assertEqual(pool.size, 0)
+        self.assertEqual(len(pool.idle), 0)
+
+
+class LinkFilterTests(FoodgramTestCase):
+    def filtered(self, user, **params):
+        request = APIRequestFactory().get('/api/recipes/', params)
+        request.user = user
+        return RecipeFilter(params, Recipe.objects.all(),
+                            request=request).qs
+
+    def test_anonymous_runs_no_queries(self):
+        anonymous = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertEqual(list(self.filtered(anonymous, is_favorited=1)),
+                             [])
+            self.assertEqual(list(self.filtered(
+                anonymous, is_in_shopping_cart=1)), [])
+            unfiltered = self.filtered(anonymous, is_favorited=0,
+                                       is_in_shopping_cart=0)
+        self.assertNotIn('foodgram_favourite', str(unfiltered.query))
+        self.assertNotIn('foodgram_shoppingcart', str(unfiltered.query))
+
+        for value, count in ((1, 0), (0, len(self.recipes))):
+            response = self.client_for().get('/api/recipes/',
+                                             {'is_favorited': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['count'], count)
+
+    def test_authenticated(self):
+        self.assertEqual(list(self.filtered(self.reader, is_favorited=1)),
+                         [self.recipes[0]])
+        self.assertNotIn(self.recipes[0],
+                         self.filtered(self.reader, is_favorited=0))
+        self.assertEqual(
+            list(self.filtered(self.reader, is_in_shopping_cart=1)),
+            [self.recipes[1]])
+        self.assertNotIn(self.recipes[1],
+                         self.filtered(self.reader, is_in_shopping_cart=0))
+
+
+class TagFilterTests(FoodgramTestCase):
+    def test_reuses_loaded_stamps(self):
+        client = self.client_for()
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/recipes/',
+                                      {'tags': ['tag0', 'missing']})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['count'], len(self.recipes))
+            # The conditional GET reads the stamps; the filter does not.
+            self.assertEqual(len([query for query in queries
+                                  if 'versionstamp' in query['sql']]), 1)
+
+    def test_without_view(self):
+        request = APIRequestFactory().get('/api/recipes/')
+        self.assertEqual(
+            RecipeFilter({'tags': ['tag0']}, Recipe.objects.all(),
+                         request=request).qs.count(),
+            len(self.recipes))
@@ -2,9 +2,9 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (ChangePasswordView, FavoriteView, IngredientsViewSet,
-                    RecipeViewSet, ShoppingCartView, SubscriptionsViewSet,
-                    SubscriptionView, TagViewSet, TokenDeleteView,
-                    TokenObtainView, UserViewSet)
+                    JobView, RecipeViewSet, ShoppingCartView,
+                    SubscriptionsViewSet, SubscriptionView, TagViewSet,
+                    TokenDeleteView, TokenObtainView, UserViewSet)
 
 app_name = 'api'
 
@@ -55,5 +55,10 @@ urlpatterns = [
         TokenDeleteView.as_view(),
         name='token_delete'
     ),
+    path(
+        r'jobs/<int:pk>/',
+        JobView.as_view(),
+        name='job'
+    ),
     path('', include(router.urls)),
 ]
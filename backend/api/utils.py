@@ -1,3 +1,12 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from foodgram import versions
+from foodgram.models import Recipe, Tag
+
+_tag_registry = (None, None)
+
+
 def get_user_from_serializer_context(serializer):
     if 'request' in serializer.context:
         request = serializer.context['request']
@@ -5,3 +14,47 @@ def get_user_from_serializer_context(serializer):
             return request.user
 
     return None
+
+
+def get_latest_recipes(author_ids, limit):
+    """Return {author_id: [recipe, ...]} with the `limit` newest recipes of
+    each author, fetched in one query ranked by ROW_NUMBER() per author.
+    """
+    recipes = {author_id: [] for author_id in author_ids}
+    if not recipes or limit <= 0:
+        return recipes
+
+    ranked = (Recipe.objects
+              .filter(author_id__in=recipes)
+              .annotate(recipe_rank=Window(
+                  expression=RowNumber(),
+                  partition_by=[F('author_id')],
+                  order_by=[F('pub_date').desc(), F('id').desc()]))
+              .values('id', 'author_id', 'name', 'image', 'image_thumbnail',
+                      'image_webp', 'image_thumbnail_webp',
+                      'image_placeholder', 'cooking_time', 'pub_date',
+                      'recipe_rank'))
+    sql, params = ranked.query.sql_with_params()
+    for recipe in Recipe.objects.raw(
+            'SELECT * FROM ({}) ranked WHERE ranked.recipe_rank <= %s '
+            'ORDER BY ranked.recipe_rank'.format(sql),
+            params + (limit,)):
+        recipes[recipe.author_id].append(recipe)
+
+    return recipes
+
+
+def get_tag_registry(version=None):
+    """{slug: id} of all tags, reloaded only when the tags stamp moves.
+
+    Pass the tags stamp `version` when the request has loaded it already.
+    """
+    global _tag_registry
+    if version is None:
+        version = versions.get_stamps(versions.TAGS)[versions.TAGS][0]
+    built_for, registry = _tag_registry
+    if registry is None or built_for != version:
+        registry = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_registry = (version, registry)
+
+    return registry
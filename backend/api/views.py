@@ -1,25 +1,47 @@
+import uuid
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
 from django.http import Http404, StreamingHttpResponse
 from django_filters import rest_framework as filters
 from rest_framework import mixins, status, views, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.generics import get_object_or_404
+from rest_framework.generics import RetrieveAPIView, get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
+from .catalogue import CatalogueMixin, renders_plain_json, stream_json
+from .conditional import ConditionalGetMixin
+from .documents import RecipeDocumentMixin
 from .filters import IngredientFilter, RecipeFilter
+from .importer import RecipeImporter, import_file
+from .microcache import MicrocacheMixin
+from .pagination import FeedPagination, SubscriptionsPagination
+from .representations import (INGREDIENT_FIELDS, TAG_FIELDS, ValuesReadMixin,
+                              ingredients, recipe_values, recipes, tags)
+from .search import get_ingredient_index
 from .serializers import (AuthorWithRecipesSerializer,
                           ChangePasswordSerializer, IngredientSerializer,
-                          RecipeMinifiedSerializer, RecipeReadSerializer,
-                          RecipeWriteSerializer, RegistrationSerializer,
-                          TagSerializer, TokenObtainSerializer,
-                          TokenSerializer, UserSerializer)
-from foodgram.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
+                          JobSerializer, RecipeMinifiedSerializer,
+                          RecipeReadSerializer, RecipeWriteSerializer,
+                          RegistrationSerializer, TagSerializer,
+                          TokenObtainSerializer, TokenSerializer,
+                          UserSerializer)
+from .utils import get_latest_recipes
+from foodgram import shopping_list, versions
+from foodgram.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                             ShoppingCart, Tag)
+from jobs.models import Job
+from jobs.queue import enqueue
 from user.models import Follower, User
-from user.permissions import IsAuthorOrReadOnlyPermission
+from user.permissions import IsAdminPermission, IsAuthorOrReadOnlyPermission
 
 
 class TokenObtainView(views.APIView):
@@ -92,20 +114,62 @@ class UserViewSet(mixins.RetrieveModelMixin,
         return Response(user_serializer.data, status=status.HTTP_200_OK)
 
 
-class TagViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
+class TagViewSet(ConditionalGetMixin, CatalogueMixin, ValuesReadMixin,
+                 mixins.RetrieveModelMixin, mixins.ListModelMixin,
                  viewsets.GenericViewSet):
+    version_stamps = [versions.TAGS]
+    catalogue_stamp = versions.TAGS
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    values_fields = TAG_FIELDS
     permission_classes = [AllowAny]
     pagination_class = None
+    represent_rows = staticmethod(tags)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, MicrocacheMixin, RecipeDocumentMixin,
+                    ValuesReadMixin, viewsets.ModelViewSet):
+    version_stamps = [versions.RECIPES, versions.TAGS, versions.INGREDIENTS]
+    microcache_stamp = versions.RECIPES
+    user_specific = True
+    etag_max_age = settings.RECIPE_COUNTERS_MAX_AGE
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
     permission_classes = [IsAuthorOrReadOnlyPermission]
     filter_backends = [filters.DjangoFilterBackend]
     filterset_class = RecipeFilter
+    pagination_class = FeedPagination
+    represent_rows = staticmethod(recipes)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.all()
+        authors = User.objects.all()
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favourite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+            authors = authors.annotate(
+                is_subscribed=Exists(Follower.objects.filter(
+                    user=user, author=OuterRef('pk'))))
+
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors),
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredientinrecipe_set',
+                     queryset=IngredientInRecipe.objects.select_related(
+                         'ingredient').order_by('id')))
+
+    def get_version_stamps(self, request):
+        stamps = super().get_version_stamps(request)
+        if request.user.is_authenticated:
+            stamps.append(versions.user_links(request.user.pk))
+        return stamps
+
+    def get_values(self, queryset):
+        return recipe_values(queryset)
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PATCH']:
@@ -113,6 +177,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return RecipeReadSerializer
 
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminPermission])
+    def import_recipes(self, request):
+        stream = request.stream
+        if stream is None:
+            raise ValidationError('Пустое тело запроса')
+
+        if request.query_params.get('background') in ('1', 'true'):
+            path = default_storage.save(
+                'imports/{}.ndjson'.format(uuid.uuid4().hex), File(stream))
+            job = enqueue(import_file, path, request.user.pk,
+                          user=request.user)
+            return Response(JobSerializer(job).data,
+                            status=status.HTTP_202_ACCEPTED,
+                            headers={'Location': reverse(
+                                'api:job', kwargs={'pk': job.pk},
+                                request=request)})
+
+        report = RecipeImporter(request.user).run(
+            iter(stream.readline, b''))
+        return Response(report, status=(status.HTTP_201_CREATED
+                                        if report['created']
+                                        else status.HTTP_400_BAD_REQUEST))
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -120,9 +208,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
 class FavoriteOrShoppingCartManagerMixin:
     model = None
 
+    def on_added(self, user, recipe):
+        pass
+
+    def on_removed(self, user, recipe):
+        pass
+
+    @transaction.atomic
     def post(self, request, id):
         try:
-            recipe = get_object_or_404(Recipe, id=id)
+            # Locked before the link row is inserted, see
+            # shopping_list.lock_recipe().
+            recipe = get_object_or_404(Recipe.objects.select_for_update(),
+                                       id=id)
         except Http404:
             return Response({"error": "Рецепт не найден"},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -133,13 +231,16 @@ class FavoriteOrShoppingCartManagerMixin:
             return Response({"error": "Рецепт уже в списке избранного"},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        self.on_added(request.user, recipe)
         serializer = RecipeMinifiedSerializer(recipe)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, id):
         try:
-            recipe = get_object_or_404(Recipe, id=id)
+            recipe = get_object_or_404(Recipe.objects.select_for_update(),
+                                       id=id)
             recipe_in_fav = get_object_or_404(
                 self.model, user=request.user, recipe=recipe)
         except Http404:
@@ -147,6 +248,7 @@ class FavoriteOrShoppingCartManagerMixin:
                             status=status.HTTP_400_BAD_REQUEST)
 
         self.model.delete(recipe_in_fav)
+        self.on_removed(request.user, recipe)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -155,20 +257,21 @@ class ShoppingCartView(views.APIView, FavoriteOrShoppingCartManagerMixin):
     permission_classes = [IsAuthenticated]
     model = ShoppingCart
 
+    def on_added(self, user, recipe):
+        shopping_list.add_recipe(user, recipe)
+
+    def on_removed(self, user, recipe):
+        shopping_list.remove_recipe(user, recipe)
+
     def get(self, request):
-        user = request.user
-        recipes = user.shopping_cart.values('recipe').all()
-        ingredients = (Ingredient.objects.
-                       filter(recipe__in=recipes).
-                       values('name', 'unit').
-                       annotate(amount=Sum('ingredientinrecipe__amount')))
+        items = (request.user.shopping_list.
+                 values_list('ingredient__name', 'amount',
+                             'ingredient__unit').
+                 order_by('ingredient__name'))
 
         rows = []
-        for ingredient in ingredients:
-            rows.append("{} {} {}\n".format
-                        (ingredient['name'],
-                         ingredient['amount'],
-                         ingredient['unit']))
+        for name, amount, unit in items:
+            rows.append("{} {} {}\n".format(name, round(amount, 3), unit))
 
         response = StreamingHttpResponse(
             rows,
@@ -186,15 +289,29 @@ class FavoriteView(views.APIView, FavoriteOrShoppingCartManagerMixin):
 class SubscriptionsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = AuthorWithRecipesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SubscriptionsPagination
 
     def get_queryset(self):
-        return User.objects.filter(
-            pk__in=self.request.user.follower.values('author').all())
+        return (User.objects
+                .filter(pk__in=self.request.user.follower.values('author'))
+                .annotate(is_subscribed=Value(True, BooleanField()))
+                .order_by('pk'))
+
+    def list(self, request, *args, **kwargs):
+        limit = AuthorWithRecipesSerializer.get_recipes_limit(request)
+        page = self.paginate_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        context['recipe_previews'] = get_latest_recipes(
+            [author.pk for author in page], limit)
+        serializer = self.get_serializer(page, many=True, context=context)
+
+        return self.get_paginated_response(serializer.data)
 
 
 class SubscriptionView(views.APIView):
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, user_id):
         author = get_object_or_404(User, id=user_id)
         if request.user == author:
@@ -207,11 +324,14 @@ class SubscriptionView(views.APIView):
             return Response({"error": "Уже подписан"},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        author.refresh_from_db(fields=['followers_count'])
+
         serializer = AuthorWithRecipesSerializer(
             author, context={'request': self.request})
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, user_id):
         author = get_object_or_404(User, id=user_id)
         if request.user == author:
@@ -230,15 +350,40 @@ class SubscriptionView(views.APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientsViewSet(mixins.RetrieveModelMixin,
+class IngredientsViewSet(ConditionalGetMixin,
+                         CatalogueMixin,
+                         ValuesReadMixin,
+                         mixins.RetrieveModelMixin,
                          mixins.ListModelMixin,
                          viewsets.GenericViewSet):
+    version_stamps = [versions.INGREDIENTS]
+    catalogue_stamp = versions.INGREDIENTS
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    values_fields = INGREDIENT_FIELDS
+    represent_rows = staticmethod(ingredients)
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+
+        return self.conditional_response(request, self.search, name)
+
+    def search(self, request, name):
+        rows = get_ingredient_index(
+            self.stamps[versions.INGREDIENTS][0]).search(
+            name, limit=settings.INGREDIENT_SEARCH_LIMIT)
+        if (len(rows) > settings.INGREDIENT_STREAM_THRESHOLD
+                and renders_plain_json(request)):
+            return StreamingHttpResponse(
+                stream_json(rows), content_type='application/json')
+
+        return Response(rows)
+
 
 class RegistrationView(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -278,3 +423,14 @@ class ChangePasswordView(views.APIView):
             user.set_password(serializer.data['new_password'])
             user.save()
             return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobView(RetrieveAPIView):
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if self.request.user.is_admin:
+            return Job.objects.all()
+
+        return Job.objects.filter(user=self.request.user)
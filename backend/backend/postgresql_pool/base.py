@@ -0,0 +1,120 @@
+import os
+import threading
+
+from django.db import connections
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from .pool import ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def check(connection):
+    if connection.closed:
+        return False
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Database.Error:
+        return False
+
+    return True
+
+
+def reset(connection):
+    """Roll back whatever the returned connection left open."""
+    if connection.closed:
+        return False
+
+    try:
+        if (connection.get_transaction_status()
+                != extensions.TRANSACTION_STATUS_IDLE):
+            connection.rollback()
+        connection.autocommit = True
+    except Database.Error:
+        return False
+
+    return (connection.get_transaction_status()
+            == extensions.TRANSACTION_STATUS_IDLE)
+
+
+def close_pools():
+    """Close idle pooled connections, e.g. in the gunicorn master
+    before it forks workers."""
+    for pool in list(_pools.values()):
+        pool.close()
+
+
+def warm_pools():
+    for alias in connections:
+        connection = connections[alias]
+        if isinstance(connection, DatabaseWrapper):
+            connection.get_pool(connection.get_connection_params()).warm()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would make
+        # DROP DATABASE fail.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that takes connections from a per-process pool
+    and puts them back on close instead of disconnecting.
+
+    Pool sizes and timeouts come from the POOL entry of the database
+    settings. Use with CONN_MAX_AGE = 0: Django then "closes" the
+    connection after every request, which returns it to the pool.
+    """
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        key = (os.getpid(), self.alias, repr(sorted(conn_params.items())))
+        if key not in _pools:
+            with _lock:
+                if key not in _pools:
+                    options = self.settings_dict.get('POOL', {})
+                    _pools[key] = ConnectionPool(
+                        lambda: Database.connect(**conn_params),
+                        check, reset,
+                        **{name.lower(): value
+                           for name, value in options.items()})
+        return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.get()
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        if self.in_atomic_block:
+            # Closed mid-transaction, e.g. after an error inside atomic():
+            # the server side state is unknown, so it is not reused.
+            self.pool.discard(self.connection)
+            return
+
+        with self.wrap_database_errors:
+            self.pool.put(self.connection)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+Entry = namedtuple('Entry', 'connection created returned')
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A thread-safe pool of DB-API connections for one worker process.
+
+    Keeps at least `min_size` and at most `max_size` connections open.
+    Idle connections are handed out last-in first-out, so the pool
+    shrinks back to `min_size` once the idle ones outlive `max_idle`.
+    Connections older than `max_lifetime` are closed when returned or
+    taken. A connection that has been idle longer than `check_idle` is
+    passed through `check` before it is handed out; `reset` is called
+    on return and must return False for a connection that cannot be
+    reused.
+    """
+
+    def __init__(self, connect, check, reset, min_size=0, max_size=4,
+                 max_lifetime=1800, max_idle=300, check_idle=30,
+                 timeout=10):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self.timeout = timeout
+        self.size = 0
+        self.idle = deque()
+        self.created = {}
+        self.condition = threading.Condition()
+
+    def get(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self.reserve(deadline)
+            if entry is None:
+                return self.open()
+
+            now = time.monotonic()
+            if (now - entry.created <= self.max_lifetime
+                    and (now - entry.returned <= self.check_idle
+                         or self.check(entry.connection))):
+                return entry.connection
+
+            self.discard(entry.connection)
+
+    def put(self, connection):
+        created = self.created[id(connection)]
+        if (time.monotonic() - created > self.max_lifetime
+                or not self.reset(connection)):
+            self.discard(connection)
+            return
+
+        with self.condition:
+            self.idle.append(Entry(connection, created, time.monotonic()))
+            self.reap()
+            self.condition.notify()
+
+    def warm(self):
+        with self.condition:
+            missing = max(self.min_size - self.size, 0)
+            self.size += missing
+        for _ in range(missing):
+            self.put(self.open())
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+        for entry in idle:
+            self.discard(entry.connection)
+
+    def reserve(self, deadline):
+        """Take an idle entry, or None once a slot for a new connection
+        is reserved; waits while the pool is exhausted."""
+        with self.condition:
+            while True:
+                self.reap()
+                if self.idle:
+                    return self.idle.pop()
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        'все {} соединений заняты'.format(self.max_size))
+                self.condition.wait(remaining)
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        self.created[id(connection)] = time.monotonic()
+        return connection
+
+    def discard(self, connection):
+        self.created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def reap(self):
+        """Close connections past their lifetime or idle beyond
+        max_idle above min_size. Called with the condition held."""
+        now = time.monotonic()
+        while self.idle:
+            entry = self.idle[0]
+            expired = now - entry.created > self.max_lifetime
+            stale = (now - entry.returned > self.max_idle
+                     and self.size > self.min_size)
+            if not (expired or stale):
+                break
+            self.idle.popleft()
+            self.created.pop(id(entry.connection), None)
+            self.size -= 1
+            try:
+                entry.connection.close()
+            except Exception:
+                pass
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,10 +23,13 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'user.apps.UserConfig',
     'foodgram.apps.FoodgramConfig',
+    'jobs.apps.JobsConfig',
     'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,15 +62,94 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE',
-                            default='django.db.backends.postgresql'),
+                            default='backend.postgresql_pool'),
         'NAME': os.getenv('DB_NAME', default='foodgram'),
         'USER': os.getenv('POSTGRES_USER', default='foodgram'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='qwe123'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Per-process pool of backend.postgresql_pool, see gunicorn.conf.py
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': int(os.getenv(
+                'DB_POOL_MAX_SIZE', os.getenv('GUNICORN_THREADS', 4))),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'CHECK_IDLE': int(os.getenv('DB_POOL_CHECK_IDLE', 30)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
+# Read replicas: "host[:port]" for Postgres or file paths for SQLite,
+# comma-separated. Reads of safe requests go to them via ReplicaRouter.
+# A replica that does not answer within REPLICA_CONNECT_TIMEOUT seconds
+# fails its health check instead of hanging it.
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2))
+for number, replica in enumerate(filter(None, os.getenv(
+        'DB_REPLICAS', default='').split(','))):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        location = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host,
+                    'PORT': port or DATABASES['default']['PORT'],
+                    'OPTIONS': {'connect_timeout': REPLICA_CONNECT_TIMEOUT}}
+    DATABASES['replica_{}'.format(number)] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'}, **location)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_STICKY_COOKIE = 'primary_until'
+# Where the primary-only window of token users is kept; it must be seen
+# by every worker (api.checks).
+REPLICA_STICKY_CACHE_ALIAS = os.getenv('REPLICA_STICKY_CACHE_ALIAS', 'shared')
+REPLICA_HEALTH_INTERVAL = int(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', 30))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    # Seen by every worker: token lookups (api.authentication), the
+    # primary-only windows of users after a write (api.replicas) and
+    # anonymous recipe reads with their locks (api.microcache). The
+    # default directory is shared by the workers of one host; for several
+    # hosts point it at memcached. api.checks rejects a per-process cache.
+    'shared': {
+        'BACKEND': os.getenv(
+            'SHARED_CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'SHARED_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    },
+}
+for cache in CACHES.values():
+    if 'memcached' not in cache['BACKEND']:
+        # Room for a recipe document per recipe (api.documents) and a
+        # token per active user; memcached would pass OPTIONS on to its
+        # client instead.
+        cache['OPTIONS'] = {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        }
+
+# Favourite and cart counters of recipes move without a version stamp
+# bump; recipe ETags change at least this often (seconds) to pick them up.
+RECIPE_COUNTERS_MAX_AGE = int(os.getenv('RECIPE_COUNTERS_MAX_AGE', 60))
+
+# Anonymous recipe reads (api.microcache); 0 turns the cache off. The
+# cache holds the recompute locks too, so it must be seen by every
+# worker (api.checks).
+MICROCACHE_TTL = int(os.getenv('MICROCACHE_TTL', 5))
+MICROCACHE_ALIAS = os.getenv('MICROCACHE_ALIAS', 'shared')
+MICROCACHE_STALE_TTL = int(os.getenv('MICROCACHE_STALE_TTL', 30))
+MICROCACHE_LOCK_TIMEOUT = int(os.getenv('MICROCACHE_LOCK_TIMEOUT', 10))
+MICROCACHE_WAIT_MS = int(os.getenv('MICROCACHE_WAIT_MS', 500))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,11 +188,73 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
 }
 
 AUTH_USER_MODEL = 'user.User'
+
+REQUEST_INSTRUMENTATION = os.getenv(
+    'REQUEST_INSTRUMENTATION', 'true') == 'true'
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', 20))
+REQUEST_TIME_BUDGET_MS = int(os.getenv('REQUEST_TIME_BUDGET_MS', 500))
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Render recipe, tag and ingredient reads from .values() rows instead of
+# the serializers (api.representations).
+FAST_SERIALIZATION = os.getenv('FAST_SERIALIZATION', 'true') == 'true'
+# Cached recipe documents (api.documents); 0 turns them off.
+RECIPE_DOCUMENT_TTL = int(os.getenv('RECIPE_DOCUMENT_TTL', 3600))
+
+# Requests within REQUEST_QUERY_BUDGET and REQUEST_TIME_BUDGET_MS are
+# logged at INFO, over-budget ones at WARNING; by default only the latter
+# are written. Set REQUEST_LOG_LEVEL=INFO to log every request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Ingredient search results longer than this are streamed in chunks.
+INGREDIENT_STREAM_THRESHOLD = int(
+    os.getenv('INGREDIENT_STREAM_THRESHOLD', 500))
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+RECIPE_SEARCH_FALLBACK_LIMIT = int(
+    os.getenv('RECIPE_SEARCH_FALLBACK_LIMIT', 200))
+
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE', 5 * 2 ** 20))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25 * 10 ** 6))
+IMAGE_THUMBNAIL_SIZE = (480, 480)
+
+JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', 2))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+# A worker reports on its running jobs every JOB_HEARTBEAT_INTERVAL
+# seconds; a job not reported for JOB_TIMEOUT seconds is requeued.
+JOB_HEARTBEAT_INTERVAL = int(os.getenv('JOB_HEARTBEAT_INTERVAL', 30))
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 600))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+JOB_SCHEDULE = {
+    'foodgram.tasks.reconcile_counters': 24 * 60 * 60,
+}
+
+TOKEN_AUTH_CACHE_ALIAS = os.getenv('TOKEN_AUTH_CACHE_ALIAS', 'shared')
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', 60))
@@ -1,7 +1,22 @@
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError, connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+
+def warm_up():
+    from api.search import build_ingredient_index
+
+    try:
+        build_ingredient_index()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
+
+
+warm_up()
@@ -8,9 +8,12 @@ class RecipeAdmin(admin.ModelAdmin):
         'pk',
         'author_username',
         'name',
+        'favourites_count',
+        'shopping_cart_count',
     )
     list_filter = ('author__username', 'name', 'tags__name')
-    readonly_fields = ['recipe_fav_count']
+    list_select_related = ('author',)
+    readonly_fields = ['recipe_fav_count', 'shopping_cart_count']
 
     def author_username(self, obj):
         return obj.author.username
@@ -23,7 +26,7 @@ class RecipeAdmin(admin.ModelAdmin):
         return ', '.join(tags_name)
 
     def recipe_fav_count(self, obj):
-        return obj.favourites.count()
+        return obj.favourites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -1,5 +1,42 @@
 from django.apps import AppConfig
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
 
 
 class FoodgramConfig(AppConfig):
     name = 'foodgram'
+
+    def ready(self):
+        from .models import Recipe
+        from .signals import (bump_ingredients, bump_recipe_tags, bump_recipes,
+                              bump_tags, bump_user_links, check_author_fields,
+                              count_created, count_deleted,
+                              remove_deleted_recipe_from_shopping_lists,
+                              touch_recipe, touch_recipe_of_ingredient,
+                              touch_recipe_tags, touch_recipes_of_author)
+
+        pre_delete.connect(remove_deleted_recipe_from_shopping_lists,
+                           sender='foodgram.Recipe')
+
+        for sender in ('foodgram.Recipe', 'foodgram.Favourite',
+                       'foodgram.ShoppingCart', 'user.Follower'):
+            post_save.connect(count_created, sender=sender)
+            post_delete.connect(count_deleted, sender=sender)
+
+        for signal in (post_save, post_delete):
+            signal.connect(bump_tags, sender='foodgram.Tag')
+            signal.connect(bump_ingredients, sender='foodgram.Ingredient')
+            for sender in ('foodgram.Recipe', 'foodgram.IngredientInRecipe'):
+                signal.connect(bump_recipes, sender=sender)
+            for sender in ('foodgram.Favourite', 'foodgram.ShoppingCart',
+                           'user.Follower'):
+                signal.connect(bump_user_links, sender=sender)
+        m2m_changed.connect(bump_recipe_tags, sender=Recipe.tags.through)
+
+        post_save.connect(touch_recipe, sender='foodgram.Recipe')
+        pre_save.connect(check_author_fields, sender='user.User')
+        post_save.connect(touch_recipes_of_author, sender='user.User')
+        for signal in (post_save, post_delete):
+            signal.connect(touch_recipe_of_ingredient,
+                           sender='foodgram.IngredientInRecipe')
+        m2m_changed.connect(touch_recipe_tags, sender=Recipe.tags.through)
@@ -0,0 +1,52 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favourite, Recipe, ShoppingCart
+from user.models import Follower, User
+
+
+def increment(model, pk, field, delta=1):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def decrement(model, pk, field):
+    model.objects.filter(pk=pk, **{field + '__gt': 0}).update(
+        **{field: F(field) - 1})
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField()), 0)
+
+
+COUNTERS = [
+    (Recipe, 'favourites_count', Favourite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follower, 'author'),
+    (User, 'following_count', Follower, 'user'),
+]
+
+
+def reconcile(fix=True):
+    """Compare every counter column with a COUNT(*) of its source rows.
+
+    Returns {'Model.field': number of drifted rows}; with `fix` the
+    drifted rows are rewritten from the source tables.
+    """
+    drift = {}
+    for model, field, source, source_field in COUNTERS:
+        drifted = (model.objects
+                   .annotate(actual=count_of(source, source_field))
+                   .exclude(**{field: F('actual')})
+                   .values_list('pk', flat=True))
+        drifted_ids = list(drifted)
+        drift['{}.{}'.format(model.__name__, field)] = len(drifted_ids)
+        if fix and drifted_ids:
+            model.objects.filter(pk__in=drifted_ids).update(
+                **{field: count_of(source, source_field)})
+
+    return drift
@@ -0,0 +1,139 @@
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from PIL import Image
+
+from . import versions
+from .models import Recipe
+from jobs.queue import enqueue, enqueue_many, job
+
+VARIANTS_DIR = 'variants'
+VARIANT_FIELDS = ('image_thumbnail', 'image_webp', 'image_thumbnail_webp')
+PLACEHOLDER_SIZE = (16, 16)
+
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(image):
+    """Return {field: bytes} for the stored variants plus the placeholder
+    as a data URI."""
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    opaque = image.convert('RGB')
+
+    thumbnail = opaque.copy()
+    thumbnail.thumbnail(settings.IMAGE_THUMBNAIL_SIZE)
+    thumbnail_webp = image.copy()
+    thumbnail_webp.thumbnail(settings.IMAGE_THUMBNAIL_SIZE)
+    placeholder = opaque.copy()
+    placeholder.thumbnail(PLACEHOLDER_SIZE)
+
+    return {
+        'image_thumbnail': encode(thumbnail, 'JPEG', quality=80,
+                                  optimize=True),
+        'image_webp': encode(image, 'WEBP', quality=80),
+        'image_thumbnail_webp': encode(thumbnail_webp, 'WEBP', quality=75),
+        'image_placeholder': 'data:image/jpeg;base64,' + base64.b64encode(
+            encode(placeholder, 'JPEG', quality=40)).decode(),
+    }
+
+
+@job(max_attempts=3, retry_delay=30)
+def generate_variants(recipe_id, image_name):
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).only(
+        'id', 'image').first()
+    if recipe is None:
+        return False
+
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+
+    variants = render_variants(image)
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    names = {
+        'image_thumbnail': '{}_thumb.jpg',
+        'image_webp': '{}.webp',
+        'image_thumbnail_webp': '{}_thumb.webp',
+    }
+    values = {'image_placeholder': variants.pop('image_placeholder')}
+    saved = []
+    for field, pattern in names.items():
+        storage = Recipe._meta.get_field(field).storage
+        values[field] = storage.save(
+            os.path.join(VARIANTS_DIR, pattern.format(stem)),
+            ContentFile(variants[field]))
+        saved.append((storage, values[field]))
+
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name).update(
+            document_version=F('document_version') + 1, **values)
+        if updated:
+            versions.bump(versions.RECIPES)
+
+    if not updated:
+        # The image was replaced or the recipe deleted meanwhile.
+        delete_files(saved)
+    return bool(updated)
+
+
+def has_custom_image(recipe):
+    return bool(recipe.image) and recipe.image.name != Recipe._meta.get_field(
+        'image').default
+
+
+def schedule_variants(recipe):
+    """Queue variant generation; the job row commits with the recipe."""
+    if has_custom_image(recipe):
+        enqueue(generate_variants, recipe.pk, recipe.image.name)
+
+
+def schedule_variants_many(recipes):
+    enqueue_many(generate_variants, [
+        (recipe.pk, recipe.image.name)
+        for recipe in recipes if has_custom_image(recipe)])
+
+
+def stored_files(recipe):
+    """(storage, name) of the uploaded image and its variants, leaving
+    out the default image all recipes share."""
+    files = [getattr(recipe, field) for field in VARIANT_FIELDS]
+    if has_custom_image(recipe):
+        files.append(recipe.image)
+    return [(file.storage, file.name) for file in files if file]
+
+
+def delete_files(files):
+    for storage, name in files:
+        storage.delete(name)
+
+
+def delete_files_on_commit(recipe):
+    """Delete the recipe's stored files once the transaction that
+    replaces them commits; a rollback keeps them.
+
+    The names are read from the row rather than from `recipe`, which may
+    predate a generate_variants run; lock the row first.
+    """
+    files = stored_files(Recipe.objects.only('image', *VARIANT_FIELDS).get(
+        pk=recipe.pk))
+    if files:
+        transaction.on_commit(lambda: delete_files(files))
+
+
+def clear_variants(recipe):
+    recipe.image_thumbnail = ''
+    recipe.image_webp = ''
+    recipe.image_thumbnail_webp = ''
+    recipe.image_placeholder = ''
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import generate_variants
+from foodgram.models import Recipe
+from jobs.queue import enqueue_many
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры, WebP и заглушки для рецептов, у которых '
+            'их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='пересоздать варианты для всех рецептов')
+        parser.add_argument('--now', action='store_true',
+                            help='выполнить сразу, не ставя задачи '
+                                 'в очередь')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image=Recipe._meta.get_field('image').default)
+        if not options['all']:
+            recipes = recipes.filter(image_thumbnail='')
+
+        pending = list(recipes.values_list('id', 'image'))
+        if not options['now']:
+            enqueue_many(generate_variants, pending)
+            self.stdout.write(self.style.SUCCESS(
+                'поставлено задач: {}'.format(len(pending))))
+            return
+
+        for recipe_id, image_name in pending:
+            generate_variants(recipe_id, image_name)
+
+        self.stdout.write(self.style.SUCCESS(
+            'обработано рецептов: {}'.format(len(pending))))
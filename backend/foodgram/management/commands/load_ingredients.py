@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram import versions
+from foodgram.models import Ingredient
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv')
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('unit').max_length
+JSON_SEPARATORS = ' \t\r\n[,]'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2:
+            yield None, None
+            continue
+
+        yield row[0], row[1]
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Yield (name, unit) pairs from a JSON array without loading it whole.
+
+    Accepts the `[{"name": ..., "measurement_unit": ...}, ...]` layout of
+    data/ingredients.json as well as one object per line (NDJSON).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный JSON: {}'.format(
+                        buffer[position:position + 80]))
+            else:
+                if isinstance(item, dict):
+                    yield item.get('name'), item.get(
+                        'measurement_unit', item.get('unit'))
+                else:
+                    yield None, None
+                continue
+        elif eof:
+            return
+
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из data/ingredients.csv или .json '
+            'пакетами через bulk_create, пропуская уже существующие.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--format', choices=['csv', 'json'])
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        file_format = options['format'] or (
+            'json' if path.endswith(('.json', '.ndjson')) else 'csv')
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+
+        if not os.path.exists(path):
+            raise CommandError('Файл {} не найден'.format(path))
+
+        reader = read_json if file_format == 'json' else read_csv
+        stats = {'read': 0, 'invalid': 0, 'existing': 0, 'inserted': 0}
+        started = time.monotonic()
+        with open(path, encoding='utf-8', newline='') as file:
+            batch = set()
+            for name, unit in reader(file):
+                stats['read'] += 1
+                row = self.clean_row(name, unit)
+                if row is None:
+                    stats['invalid'] += 1
+                    continue
+
+                batch.add(row)
+                if len(batch) >= batch_size:
+                    self.write_batch(batch, stats, options['dry_run'])
+                    batch = set()
+
+            if batch:
+                self.write_batch(batch, stats, options['dry_run'])
+
+        if stats['inserted'] and not options['dry_run']:
+            versions.bump(versions.INGREDIENTS)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            '{prefix}прочитано: {read}, добавлено: {inserted}, '
+            'уже были: {existing}, с ошибками: {invalid}; '
+            '{rate:.0f} строк/с за {elapsed:.2f} с'.format(
+                prefix='[dry-run] ' if options['dry_run'] else '',
+                rate=stats['read'] / elapsed,
+                elapsed=elapsed,
+                **stats)))
+
+    def clean_row(self, name, unit):
+        if not isinstance(name, str) or not isinstance(unit, str):
+            return None
+
+        name = name.strip()
+        unit = unit.strip()
+        if (not name or not unit or len(name) > NAME_MAX_LENGTH
+                or len(unit) > UNIT_MAX_LENGTH):
+            return None
+
+        return name, unit
+
+    def write_batch(self, batch, stats, dry_run):
+        existing = set(Ingredient.objects
+                       .filter(name__in={name for name, _ in batch})
+                       .values_list('name', 'unit'))
+        new_rows = batch - existing
+        stats['existing'] += len(batch) - len(new_rows)
+        stats['inserted'] += len(new_rows)
+        if dry_run or not new_rows:
+            return
+
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, unit=unit) for name, unit in new_rows],
+            ignore_conflicts=True)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from foodgram import shopping_list
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет агрегированные списки покупок с корзинами и '
+            'пересобирает расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users')
+        parser.add_argument('--check', action='store_true',
+                            help='только показать расхождения')
+
+    def handle(self, *args, **options):
+        users = (User.objects
+                 .filter(Q(shopping_cart__isnull=False)
+                         | Q(shopping_list__isnull=False))
+                 .distinct().order_by('pk').values_list('pk', flat=True))
+        if options['users']:
+            users = users.filter(pk__in=options['users'])
+
+        checked = drifted = 0
+        for user_id in users.iterator():
+            checked += 1
+            with transaction.atomic():
+                drift = shopping_list.find_drift(user_id)
+                if not drift:
+                    continue
+
+                drifted += 1
+                for ingredient_id, (expected, stored) in drift.items():
+                    self.stdout.write(
+                        'user={} ingredient={}: ожидалось {}, '
+                        'в таблице {}'.format(
+                            user_id, ingredient_id, expected, stored))
+
+                if not options['check']:
+                    shopping_list.rebuild(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            'проверено пользователей: {}, с расхождениями: {}{}'.format(
+                checked, drifted,
+                '' if options['check'] or not drifted else ' (исправлено)')))
+        if options['check'] and drifted:
+            raise CommandError('найдены расхождения в списках покупок')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram import counters, versions
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, корзин, рецептов и подписок '
+            'с исходными таблицами и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='только показать расхождения')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = counters.reconcile(fix=not options['check'])
+            if not options['check'] and any(drift.values()):
+                versions.bump(versions.RECIPES)
+
+        for counter, drifted in drift.items():
+            self.stdout.write('{}: расхождений {}'.format(counter, drifted))
+
+        total = sum(drift.values())
+        if options['check'] and total:
+            raise CommandError('найдены расхождения в счётчиках')
+
+        self.stdout.write(self.style.SUCCESS(
+            'исправлено строк: {}'.format(total)
+            if not options['check'] else 'счётчики в порядке'))
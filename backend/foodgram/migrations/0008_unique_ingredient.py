@@ -0,0 +1,53 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('foodgram', 'Ingredient')
+    IngredientInRecipe = apps.get_model('foodgram', 'IngredientInRecipe')
+
+    duplicates = (Ingredient.objects.values('name', 'unit')
+                  .annotate(keep_id=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Ingredient.objects
+                         .filter(name=duplicate['name'],
+                                 unit=duplicate['unit'])
+                         .exclude(id=keep_id)
+                         .values_list('id', flat=True))
+        # The keeper's rows come first, so renaming a duplicate's row never
+        # clashes with unique_recipe_ingredient; a duplicate in a recipe
+        # that already has one adds its amount to it.
+        kept = {row.recipe_id: row for row in
+                IngredientInRecipe.objects.filter(ingredient_id=keep_id)}
+        for row in (IngredientInRecipe.objects
+                    .filter(ingredient_id__in=extra_ids).order_by('id')):
+            keeper = kept.get(row.recipe_id)
+            if keeper is None:
+                row.ingredient_id = keep_id
+                row.save(update_fields=['ingredient'])
+                kept[row.recipe_id] = row
+                continue
+            keeper.amount += row.amount
+            keeper.save(update_fields=['amount'])
+            row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0007_auto_20220418_1424'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'unit'), name='unique_ingredient'),
+        ),
+    ]
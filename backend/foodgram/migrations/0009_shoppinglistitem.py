@@ -0,0 +1,47 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('foodgram', 'ShoppingListItem')
+
+    totals = (ShoppingCart.objects
+              .filter(recipe__ingredientinrecipe__isnull=False)
+              .values('user_id', 'recipe__ingredientinrecipe__ingredient_id')
+              .annotate(amount=Sum('recipe__ingredientinrecipe__amount')))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=total['user_id'],
+            ingredient_id=total['recipe__ingredientinrecipe__ingredient_id'],
+            amount=total['amount'])
+        for total in totals.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0008_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.FloatField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodgram.Ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
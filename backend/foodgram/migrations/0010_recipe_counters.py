@@ -0,0 +1,51 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Favourite = apps.get_model('foodgram', 'Favourite')
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    User = apps.get_model('user', 'User')
+    Follower = apps.get_model('user', 'Follower')
+
+    Recipe.objects.update(
+        favourites_count=count_of(Favourite, 'recipe'),
+        shopping_cart_count=count_of(ShoppingCart, 'recipe'))
+    User.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Follower, 'author'),
+        following_count=count_of(Follower, 'user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0009_shoppinglistitem'),
+        ('user', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favourites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
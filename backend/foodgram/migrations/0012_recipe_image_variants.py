@@ -0,0 +1,33 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0011_versionstamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Миниатюра'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Миниатюра WebP'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Картинка WebP'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:23
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+INDEX_NAME = 'foodgram_recipe_search_gin'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    config = settings.RECIPE_SEARCH_CONFIG
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)))
+    schema_editor.execute(
+        'CREATE INDEX {} ON foodgram_recipe USING gin (search_vector)'
+        .format(INDEX_NAME))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0012_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
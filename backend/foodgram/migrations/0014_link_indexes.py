@@ -0,0 +1,37 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favourite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favourites', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='favourite',
+            index=models.Index(fields=['user', 'recipe'], name='favourite_user_recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', 'recipe'], name='shopping_cart_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0014_link_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='document_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
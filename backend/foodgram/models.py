@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -32,6 +33,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -45,6 +52,14 @@ class Recipe(models.Model):
 
     name = models.CharField(max_length=200, verbose_name='Название рецепта')
     image = models.ImageField(default='blank.jpg', verbose_name='Картинка')
+    image_thumbnail = models.ImageField(
+        blank=True, editable=False, verbose_name='Миниатюра')
+    image_webp = models.ImageField(
+        blank=True, editable=False, verbose_name='Картинка WebP')
+    image_thumbnail_webp = models.ImageField(
+        blank=True, editable=False, verbose_name='Миниатюра WebP')
+    image_placeholder = models.TextField(
+        blank=True, editable=False, verbose_name='Заглушка')
     text = models.TextField(verbose_name='Описание рецепта')
     cooking_time = models.IntegerField(validators=[MinValueValidator(1)])
     tags = models.ManyToManyField(Tag)
@@ -57,11 +72,24 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, db_index=True, verbose_name='Дата добавления'
     )
+    favourites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок'
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    document_version = models.PositiveIntegerField(default=0,
+                                                   editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date'),
+        ]
 
     def __str__(self):
         return self.name
@@ -89,7 +117,8 @@ class Favourite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='favourites'
+        related_name='favourites',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -104,13 +133,18 @@ class Favourite(models.Model):
                 name='unique_favourite_recipe'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='favourite_user_recipe'),
+        ]
 
 
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='shopping_cart'
+        related_name='shopping_cart',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -125,3 +159,35 @@ class ShoppingCart(models.Model):
                 name='unique_user_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='shopping_cart_user_recipe'),
+        ]
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    amount = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+
+class VersionStamp(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated = models.DateTimeField()
@@ -0,0 +1,125 @@
+from django.db.models import Case, F, FloatField, Sum, Value, When
+
+from .models import IngredientInRecipe, Recipe, ShoppingCart, ShoppingListItem
+from user.models import User
+
+EPSILON = 1e-9
+
+
+def lock_recipe(recipe_id):
+    """Lock the recipe row until the end of the transaction.
+
+    Taken before reading a recipe's amounts or the carts holding it, so
+    a cart change and an edit of the same recipe run one after the
+    other: each sees the amounts and the carts the other committed.
+    Callers that insert a cart row must lock first, since the insert
+    already holds a weaker lock on the recipe row.
+    """
+    list(Recipe.objects.select_for_update().filter(pk=recipe_id)
+         .values_list('pk'))
+
+
+def recipe_amounts(recipe_id):
+    return dict(IngredientInRecipe.objects
+                .filter(recipe_id=recipe_id)
+                .values_list('ingredient_id', 'amount'))
+
+
+def apply_amounts(user_ids, amounts):
+    """Add `amounts` ({ingredient_id: delta}) to the lists of `user_ids`.
+
+    Must be called inside the transaction that changes the cart or the
+    recipe, so the aggregate never diverges from the source rows.
+    """
+    amounts = {ingredient_id: amount
+               for ingredient_id, amount in amounts.items() if amount}
+    user_ids = list(user_ids)
+    if not amounts or not user_ids:
+        return
+
+    list(User.objects.select_for_update()
+         .filter(pk__in=user_ids).order_by('pk').values_list('pk'))
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=amounts)
+    items.update(amount=F('amount') + Case(
+        *[When(ingredient_id=ingredient_id, then=Value(amount))
+          for ingredient_id, amount in amounts.items()],
+        output_field=FloatField()))
+
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=amount)
+        for user_id in user_ids
+        for ingredient_id, amount in amounts.items()
+        if amount > 0 and (user_id, ingredient_id) not in existing)
+
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, amount__lt=EPSILON).delete()
+
+
+def add_recipe(user, recipe):
+    lock_recipe(recipe.id)
+    apply_amounts([user.id], recipe_amounts(recipe.id))
+
+
+def remove_recipe(user, recipe):
+    lock_recipe(recipe.id)
+    apply_amounts([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe.id).items()})
+
+
+def remove_recipe_from_all(recipe):
+    lock_recipe(recipe.id)
+    apply_amounts(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True),
+        {ingredient_id: -amount
+         for ingredient_id, amount in recipe_amounts(recipe.id).items()})
+
+
+def change_recipe(recipe, old_amounts, new_amounts):
+    """Apply an edit of the recipe's amounts to the carts holding it;
+    `old_amounts` must have been read under lock_recipe()."""
+    deltas = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in set(old_amounts) | set(new_amounts)}
+    apply_amounts(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True),
+        deltas)
+
+
+def expected_amounts(user_id):
+    return dict(ShoppingCart.objects
+                .filter(user_id=user_id,
+                        recipe__ingredientinrecipe__isnull=False)
+                .values_list('recipe__ingredientinrecipe__ingredient_id')
+                .annotate(amount=Sum('recipe__ingredientinrecipe__amount')))
+
+
+def stored_amounts(user_id):
+    return dict(ShoppingListItem.objects
+                .filter(user_id=user_id)
+                .values_list('ingredient_id', 'amount'))
+
+
+def find_drift(user_id):
+    expected = expected_amounts(user_id)
+    stored = stored_amounts(user_id)
+    return {
+        ingredient_id: (expected.get(ingredient_id, 0),
+                        stored.get(ingredient_id, 0))
+        for ingredient_id in set(expected) | set(stored)
+        if abs(expected.get(ingredient_id, 0)
+               - stored.get(ingredient_id, 0)) > 1e-6}
+
+
+def rebuild(user_id):
+    ShoppingListItem.objects.filter(user_id=user_id).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=amount)
+        for ingredient_id, amount in expected_amounts(user_id).items())
@@ -0,0 +1,96 @@
+from . import counters, shopping_list, versions
+
+# What recipes show of their author.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def remove_deleted_recipe_from_shopping_lists(sender, instance, **kwargs):
+    shopping_list.remove_recipe_from_all(instance)
+
+
+def counted_by(sender):
+    """(model, counter field, foreign key) for counters that count
+    rows of `sender`."""
+    return [(model, field, source_field)
+            for model, field, source, source_field in counters.COUNTERS
+            if source is sender]
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    """Keep COUNTERS in step with rows added anywhere, not only through
+    the API. Fixtures carry their own counter values."""
+    if not created or raw:
+        return
+
+    for model, field, source_field in counted_by(sender):
+        counters.increment(model, getattr(instance, source_field + '_id'),
+                           field)
+
+
+def count_deleted(sender, instance, **kwargs):
+    """Also runs for admin deletes and cascades from a deleted user or
+    recipe."""
+    for model, field, source_field in counted_by(sender):
+        counters.decrement(model, getattr(instance, source_field + '_id'),
+                           field)
+
+
+def bump_tags(sender, **kwargs):
+    versions.bump(versions.TAGS, versions.RECIPES)
+
+
+def bump_ingredients(sender, **kwargs):
+    versions.bump(versions.INGREDIENTS, versions.RECIPES)
+
+
+def bump_recipes(sender, **kwargs):
+    versions.bump(versions.RECIPES)
+
+
+def bump_user_links(sender, instance, **kwargs):
+    """A favourite, cart item or subscription changed; only its user's
+    responses say so."""
+    versions.bump(versions.user_links(instance.user_id))
+
+
+def check_author_fields(sender, instance, update_fields=None, **kwargs):
+    """Note before a user save whether it changes AUTHOR_FIELDS, so that
+    last_login and password updates leave recipes alone."""
+    instance._author_changed = False
+    if instance.pk is None or (update_fields is not None and not set(
+            update_fields) & set(AUTHOR_FIELDS)):
+        return
+
+    saved = sender.objects.filter(pk=instance.pk).values(
+        *AUTHOR_FIELDS).first()
+    instance._author_changed = saved is not None and any(
+        saved[field] != getattr(instance, field) for field in AUTHOR_FIELDS)
+
+
+def bump_recipe_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        versions.bump(versions.RECIPES)
+
+
+def touch_recipe(sender, instance, **kwargs):
+    versions.touch_recipes(pk=instance.pk)
+
+
+def touch_recipe_of_ingredient(sender, instance, **kwargs):
+    versions.touch_recipes(pk=instance.recipe_id)
+
+
+def touch_recipes_of_author(sender, instance, **kwargs):
+    if getattr(instance, '_author_changed', False):
+        versions.bump(versions.RECIPES)
+        versions.touch_recipes(author_id=instance.pk)
+
+
+def touch_recipe_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            versions.touch_recipes(pk=instance.pk)
+    elif action == 'pre_clear':
+        versions.touch_recipes(tags=instance)
+    elif action.startswith('post_') and pk_set:
+        versions.touch_recipes(pk__in=pk_set)
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters, shopping_list, versions
+from jobs.queue import job
+from user.models import User
+
+
+@job(max_attempts=1)
+def reconcile_counters():
+    with transaction.atomic():
+        drift = counters.reconcile(fix=True)
+        if any(drift.values()):
+            versions.bump(versions.RECIPES)
+
+    return drift
+
+
+@job(max_attempts=1)
+def rebuild_shopping_lists(user_ids=None):
+    users = (User.objects
+             .filter(Q(shopping_cart__isnull=False)
+                     | Q(shopping_list__isnull=False))
+             .distinct().order_by('pk').values_list('pk', flat=True))
+    if user_ids:
+        users = users.filter(pk__in=user_ids)
+
+    rebuilt = []
+    for user_id in users.iterator():
+        with transaction.atomic():
+            if shopping_list.find_drift(user_id):
+                shopping_list.rebuild(user_id)
+                rebuilt.append(user_id)
+
+    return rebuilt
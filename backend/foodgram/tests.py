@@ -0,0 +1,256 @@
+import logging
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import counters, shopping_list
+from .models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Tag)
+from user.models import Follower, User
+
+
+def create_user(username):
+    user = User.objects.create_user(
+        username=username, email='{}@foodgram.test'.format(username),
+        password='password', first_name=username.title(), last_name='Тест')
+    Token.objects.create(user=user)
+    return user
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+        Token.objects.get(user=user).key))
+    return client
+
+
+class ShoppingListTests(TestCase):
+    """The ShoppingListItem aggregate matches the carts after every
+    operation that changes a cart or a recipe in it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.readers = [create_user('reader'), create_user('other')]
+        cls.tag = Tag.objects.create(name='Обед', color_code='49b64e',
+                                     slug='lunch')
+        cls.ingredients = [Ingredient.objects.create(
+            name='Ингредиент {}'.format(number), unit='г')
+            for number in range(4)]
+        cls.recipes = [
+            cls.create_recipe({0: 100, 1: 50}),
+            cls.create_recipe({1: 25, 2: 0.1}),
+            cls.create_recipe({2: 0.2, 3: 3}),
+        ]
+
+    @classmethod
+    def create_recipe(cls, amounts):
+        recipe = Recipe.objects.create(author=cls.author, name='Рецепт',
+                                       text='Описание', cooking_time=5)
+        recipe.tags.set([cls.tag])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe,
+                               ingredient=cls.ingredients[number],
+                               amount=amount)
+            for number, amount in amounts.items())
+        return recipe
+
+    def setUp(self):
+        request_logger = logging.getLogger('api.instrumentation')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.ERROR)
+
+    def cart(self, user, recipe, method='post'):
+        response = getattr(client_for(user), method)(
+            '/api/recipes/{}/shopping_cart/'.format(recipe.pk))
+        self.assertEqual(response.status_code,
+                         201 if method == 'post' else 204)
+
+    def check_lists(self):
+        for user in self.readers:
+            with self.subTest(user=user.username):
+                self.assertEqual(shopping_list.find_drift(user.pk), {})
+                self.assertEqual(
+                    set(shopping_list.stored_amounts(user.pk)),
+                    set(shopping_list.expected_amounts(user.pk)))
+
+    def test_add_and_remove(self):
+        reader = self.readers[0]
+        for recipe in self.recipes:
+            self.cart(reader, recipe)
+            self.check_lists()
+        self.assertEqual(shopping_list.stored_amounts(reader.pk)[
+            self.ingredients[1].pk], 75)
+
+        for recipe in self.recipes:
+            self.cart(reader, recipe, 'delete')
+            self.check_lists()
+        # 0.1 + 0.2 - 0.1 - 0.2 is not exactly 0; EPSILON drops the row.
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_change_ingredients(self):
+        recipe = self.recipes[0]
+        for reader in self.readers:
+            self.cart(reader, recipe)
+            self.cart(reader, self.recipes[1])
+
+        response = client_for(self.author).patch(
+            '/api/recipes/{}/'.format(recipe.pk), {
+                'tags': [self.tag.pk],
+                'ingredients': [
+                    {'id': self.ingredients[1].pk, 'amount': 10},
+                    {'id': self.ingredients[3].pk, 'amount': 7}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.check_lists()
+        self.assertNotIn(self.ingredients[0].pk,
+                         shopping_list.stored_amounts(self.readers[0].pk))
+
+    def test_delete_recipe(self):
+        for reader in self.readers:
+            for recipe in self.recipes[:2]:
+                self.cart(reader, recipe)
+
+        response = client_for(self.author).delete(
+            '/api/recipes/{}/'.format(self.recipes[0].pk))
+        self.assertEqual(response.status_code, 204)
+        self.check_lists()
+
+        # Deleting outside the API goes through the same pre_delete hook.
+        self.recipes[1].delete()
+        self.check_lists()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_find_drift_and_rebuild(self):
+        reader = self.readers[0]
+        self.cart(reader, self.recipes[0])
+        item = ShoppingListItem.objects.get(
+            user=reader, ingredient=self.ingredients[0])
+        item.amount = 1
+        item.save()
+        ShoppingListItem.objects.create(
+            user=reader, ingredient=self.ingredients[3], amount=5)
+
+        self.assertEqual(shopping_list.find_drift(reader.pk), {
+            self.ingredients[0].pk: (100, 1),
+            self.ingredients[3].pk: (0, 5)})
+        shopping_list.rebuild(reader.pk)
+        self.check_lists()
+
+    def test_rebuild_command(self):
+        reader = self.readers[0]
+        self.cart(reader, self.recipes[0])
+        ShoppingListItem.objects.filter(user=reader).update(amount=1)
+        output = []
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shopping_lists', check=True,
+                         stdout=OutputList(output))
+        self.assertNotEqual(shopping_list.find_drift(reader.pk), {})
+
+        call_command('rebuild_shopping_lists', stdout=OutputList(output))
+        self.check_lists()
+        call_command('rebuild_shopping_lists', check=True,
+                     stdout=OutputList(output))
+        self.assertIn('с расхождениями: 0', output[-1])
+
+
+class CounterTests(TestCase):
+    """Counter columns follow the rows they count however those rows
+    are added or deleted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.other = create_user('other')
+        cls.recipes = [Recipe.objects.create(
+            author=cls.author, name='Рецепт {}'.format(number),
+            text='Описание', cooking_time=5) for number in range(3)]
+        for user in (cls.reader, cls.other):
+            Follower.objects.create(user=user, author=cls.author)
+            for recipe in cls.recipes[:2]:
+                Favourite.objects.create(user=user, recipe=recipe)
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def setUp(self):
+        request_logger = logging.getLogger('api.instrumentation')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.ERROR)
+
+    def check_counters(self, **expected):
+        """No drift, and `expected` {'username.field': value} holds."""
+        self.assertFalse(any(counters.reconcile(fix=False).values()))
+        for name, value in expected.items():
+            username, field = name.split('.')
+            with self.subTest(name):
+                self.assertEqual(getattr(User.objects.get(
+                    username=username), field), value)
+
+    def test_created_rows(self):
+        self.check_counters(**{'author.recipes_count': 3,
+                               'author.followers_count': 2,
+                               'reader.following_count': 1})
+        self.assertEqual(Recipe.objects.get(
+            pk=self.recipes[0].pk).favourites_count, 2)
+
+    def test_api(self):
+        client = client_for(self.reader)
+        recipe = self.recipes[2]
+        urls = ('/api/recipes/{}/favorite/'.format(recipe.pk),
+                '/api/recipes/{}/shopping_cart/'.format(recipe.pk),
+                '/api/users/{}/subscribe/'.format(self.other.pk))
+        for url in urls:
+            self.assertEqual(client.post(url).status_code, 201)
+        self.check_counters(**{'other.followers_count': 1,
+                               'reader.following_count': 2})
+
+        for url in urls:
+            self.assertEqual(client.delete(url).status_code, 204)
+        self.check_counters(**{'other.followers_count': 0,
+                               'reader.following_count': 1})
+
+    def test_admin_deletes(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@foodgram.test',
+            password='password')
+        self.client.force_login(admin)
+        response = self.client.post(
+            '/admin/foodgram/recipe/{}/delete/'.format(self.recipes[0].pk),
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.check_counters(**{'author.recipes_count': 2})
+
+        response = self.client.post('/admin/foodgram/recipe/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [recipe.pk for recipe in self.recipes[1:]]})
+        self.assertEqual(response.status_code, 302)
+        self.check_counters(**{'author.recipes_count': 0})
+
+        response = self.client.post(
+            '/admin/user/user/{}/delete/'.format(self.reader.pk),
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.check_counters(**{'author.followers_count': 1})
+
+    def test_user_delete_cascades(self):
+        self.reader.delete()
+        self.check_counters(**{'author.followers_count': 1})
+        self.assertEqual(Recipe.objects.get(
+            pk=self.recipes[0].pk).shopping_cart_count, 1)
+
+        self.author.delete()
+        self.check_counters(**{'other.following_count': 0})
+
+
+class OutputList:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        pass
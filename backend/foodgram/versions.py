@@ -0,0 +1,45 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Recipe, VersionStamp
+
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+
+
+def user_links(user_id):
+    """Stamp of one user's favourites, shopping cart and subscriptions."""
+    return 'links:{}'.format(user_id)
+
+
+def bump(*names):
+    """Advance the version stamps of the given resources.
+
+    Called from the signal receivers in the same transaction as the write,
+    so a reader never sees new data under an old stamp.
+    """
+    now = timezone.now()
+    updated = VersionStamp.objects.filter(name__in=names).update(
+        version=F('version') + 1, updated=now)
+    if updated < len(names):
+        for name in names:
+            VersionStamp.objects.get_or_create(
+                name=name, defaults={'version': 1, 'updated': now})
+
+
+def get_stamps(*names):
+    """Return {name: (version, updated)}; unknown names get version 0."""
+    stamps = {name: (0, None) for name in names}
+    for name, version, updated in VersionStamp.objects.filter(
+            name__in=names).values_list('name', 'version', 'updated'):
+        stamps[name] = (version, updated)
+
+    return stamps
+
+
+def touch_recipes(**lookup):
+    """Advance document_version of the matching recipes, which drops
+    their cached documents (api.documents)."""
+    Recipe.objects.filter(**lookup).update(
+        document_version=F('document_version') + 1)
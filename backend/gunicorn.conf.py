@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+import shutil
+
+# Production profile: few processes with several threads each, so one
+# worker's connection pool (DB_POOL_MAX_SIZE, as many as threads) is
+# shared by its threads. Postgres sees at most workers * threads
+# connections; keep that below max_connections.
+bind = '0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def on_starting(server):
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # The preloaded app may have used the database in the master.
+    from backend.postgresql_pool.base import close_pools
+
+    close_pools()
+
+
+def post_worker_init(worker):
+    from django.db import DatabaseError
+
+    from backend.postgresql_pool.base import warm_pools
+
+    try:
+        warm_pools()
+    except DatabaseError:
+        worker.log.exception('не удалось открыть соединения с базой')
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
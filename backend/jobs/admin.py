@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'attempts',
+        'run_at',
+        'finished',
+        'user',
+    )
+    list_filter = ('status', 'name')
+    list_select_related = ('user',)
+    readonly_fields = ('created', 'started', 'heartbeat', 'finished',
+                       'worker')
+
+
+admin.site.register(Job, JobAdmin)
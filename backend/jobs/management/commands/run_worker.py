@@ -0,0 +1,123 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from jobs import queue
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = 60
+# Longest pause between attempts while the database is unreachable.
+MAX_BACKOFF = 60
+
+
+def execute(job):
+    try:
+        return queue.run(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            default=settings.JOB_WORKER_THREADS)
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true',
+                            help='выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        threads = options['threads']
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        self.stdout.write('{}: потоков {}'.format(worker, threads))
+        done = failed = 0
+        running = {}
+        self.maintained = self.reported = 0
+        backoff = options['poll_interval']
+        with ThreadPoolExecutor(max_workers=threads,
+                                thread_name_prefix='job') as pool:
+            while not stop.is_set():
+                for future in [f for f in running if f.done()]:
+                    del running[future]
+                    if self.succeeded(future):
+                        done += 1
+                    else:
+                        failed += 1
+
+                try:
+                    jobs = self.poll(worker, list(running.values()),
+                                     threads - len(running))
+                except DatabaseError:
+                    # A restart or failover of the database: drop the
+                    # broken connection and try again later.
+                    logger.exception('база данных недоступна, повтор '
+                                     'через %.0f с', backoff)
+                    self.reset_connection()
+                    stop.wait(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+
+                backoff = options['poll_interval']
+                for job in jobs:
+                    running[pool.submit(execute, job)] = job.pk
+
+                if options['once'] and not jobs and not running:
+                    break
+                if not jobs:
+                    stop.wait(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'выполнено задач: {}, с ошибками: {}'.format(done, failed)))
+
+    def poll(self, worker, running, free):
+        """Housekeeping due on this iteration, then up to `free` new
+        jobs."""
+        close_old_connections()
+        now = time.monotonic()
+        if running and now - self.reported > settings.JOB_HEARTBEAT_INTERVAL:
+            queue.heartbeat(worker, running)
+            self.reported = now
+        if now - self.maintained > MAINTENANCE_INTERVAL:
+            self.maintain()
+            self.maintained = now
+
+        return queue.claim(worker, free) if free > 0 else []
+
+    def succeeded(self, future):
+        error = future.exception()
+        if error is not None:
+            # queue.run() handles errors of the job itself; this is one
+            # of recording its outcome.
+            logger.error('не удалось записать результат задачи',
+                         exc_info=error)
+            return False
+
+        return future.result()
+
+    def reset_connection(self):
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+
+    def maintain(self):
+        recovered = queue.recover(settings.JOB_TIMEOUT)
+        if recovered:
+            self.stdout.write('возвращено в очередь: {}'.format(recovered))
+        queue.schedule_periodic(settings.JOB_SCHEDULE)
+        queue.purge(settings.JOB_RETENTION_DAYS)
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний отклик'),
+        ),
+    ]
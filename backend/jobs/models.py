@@ -0,0 +1,58 @@
+from django.db import models
+from django.utils import timezone
+
+from user.models import User
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(default='{}', verbose_name='Аргументы')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0,
+                                           verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=3,
+                                               verbose_name='Макс. попыток')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Запустить не раньше')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+    started = models.DateTimeField(null=True, blank=True,
+                                   verbose_name='Начата')
+    finished = models.DateTimeField(null=True, blank=True,
+                                    verbose_name='Завершена')
+    heartbeat = models.DateTimeField(null=True, blank=True,
+                                     verbose_name='Последний отклик')
+    worker = models.CharField(max_length=100, blank=True,
+                              verbose_name='Обработчик')
+    result = models.TextField(blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='job_status_run_at'),
+        ]
+
+    def __str__(self):
+        return '{} #{}'.format(self.name, self.pk)
@@ -0,0 +1,168 @@
+import json
+import logging
+from collections import namedtuple
+from datetime import timedelta
+from importlib import import_module
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', ['func', 'max_attempts', 'retry_delay'])
+
+registry = {}
+
+
+def job(max_attempts=3, retry_delay=30):
+    """Register a function as a background job named `module.function`.
+
+    Arguments must be JSON-serializable. A failed attempt is retried after
+    `retry_delay` seconds, doubling each time, until `max_attempts` is hit.
+    """
+    def decorator(func):
+        name = '{}.{}'.format(func.__module__, func.__name__)
+        registry[name] = Task(func, max_attempts, retry_delay)
+        func.job_name = name
+        return func
+
+    return decorator
+
+
+def get_task(name):
+    if name not in registry:
+        try:
+            import_module(name.rpartition('.')[0])
+        except ImportError:
+            return None
+
+    return registry.get(name)
+
+
+def make_job(func, args=(), kwargs=None, delay=0, user=None):
+    name = getattr(func, 'job_name', func)
+    task = get_task(name)
+    if task is None:
+        raise LookupError('Неизвестная задача {}'.format(name))
+
+    return Job(
+        name=name,
+        payload=json.dumps({'args': list(args), 'kwargs': kwargs or {}}),
+        max_attempts=task.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        user=user)
+
+
+def enqueue(func, *args, delay=0, user=None, **kwargs):
+    """Queue `func(*args, **kwargs)`.
+
+    The row is written in the caller's transaction, so a worker only picks
+    the job up once the data it refers to has been committed.
+    """
+    job = make_job(func, args, kwargs, delay, user)
+    job.save()
+    return job
+
+
+def enqueue_many(func, calls):
+    return Job.objects.bulk_create(make_job(func, args) for args in calls)
+
+
+def claim(worker, limit=1):
+    """Move up to `limit` due jobs to RUNNING for `worker`.
+
+    Each job is taken with a conditional UPDATE, so concurrent workers
+    never run the same job twice and no row locks are held meanwhile.
+    """
+    now = timezone.now()
+    candidates = (Job.objects
+                  .filter(status=Job.QUEUED, run_at__lte=now)
+                  .order_by('run_at', 'id')
+                  .values_list('id', flat=True)[:limit * 2])
+
+    claimed = []
+    for pk in candidates:
+        if len(claimed) == limit:
+            break
+        if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, started=now,
+                heartbeat=now, attempts=F('attempts') + 1):
+            claimed.append(pk)
+
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def run(job):
+    task = get_task(job.name)
+    try:
+        if task is None:
+            raise LookupError('Неизвестная задача {}'.format(job.name))
+        payload = json.loads(job.payload)
+        result = task.func(*payload['args'], **payload['kwargs'])
+    except Exception as error:
+        logger.exception('задача %s завершилась с ошибкой', job)
+        retry(job, task, error)
+        return False
+
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+        status=Job.DONE, finished=timezone.now(), error='',
+        result=json.dumps(result, ensure_ascii=False, default=str))
+    return True
+
+
+def retry(job, task, error):
+    now = timezone.now()
+    values = {'error': '{}: {}'.format(type(error).__name__, error)}
+    if task is not None and job.attempts < job.max_attempts:
+        values.update(
+            status=Job.QUEUED,
+            run_at=now + timedelta(
+                seconds=task.retry_delay * 2 ** (job.attempts - 1)))
+    else:
+        values.update(status=Job.FAILED, finished=now)
+
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(**values)
+
+
+def heartbeat(worker, job_ids):
+    """Report that `worker` is still running these jobs."""
+    return Job.objects.filter(
+        pk__in=job_ids, status=Job.RUNNING, worker=worker,
+    ).update(heartbeat=timezone.now())
+
+
+def recover(timeout):
+    """Requeue jobs left RUNNING by a worker that died mid-job.
+
+    A live worker reports on its jobs through heartbeat(), so only jobs
+    not reported for `timeout` seconds are taken back, however long
+    they have been running.
+    """
+    now = timezone.now()
+    deadline = now - timedelta(seconds=timeout)
+    stale = Job.objects.filter(
+        Q(heartbeat__lt=deadline)
+        | Q(heartbeat__isnull=True, started__lt=deadline),
+        status=Job.RUNNING)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished=now, error='Обработчик перестал отвечать')
+    requeued = stale.update(status=Job.QUEUED, run_at=now)
+    return requeued + failed
+
+
+def schedule_periodic(schedule):
+    """Keep one pending job for each `{name: interval}` entry."""
+    pending = set(Job.objects.filter(
+        name__in=schedule, status__in=[Job.QUEUED, Job.RUNNING],
+    ).values_list('name', flat=True))
+    for name, interval in schedule.items():
+        if name not in pending:
+            enqueue(name, delay=interval)
+
+
+def purge(days):
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished__lt=timezone.now() - timedelta(days=days)).delete()[0]
@@ -0,0 +1,150 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+
+@queue.job()
+def add(left, right):
+    return left + right
+
+
+@queue.job(max_attempts=3, retry_delay=10)
+def fail():
+    raise ValueError('сбой')
+
+
+def seconds_from_now(moment):
+    return (moment - timezone.now()).total_seconds()
+
+
+class QueueTests(TestCase):
+    def run_failing(self, job):
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertFalse(queue.run(job))
+
+    def test_claim_is_exclusive(self):
+        for number in range(3):
+            queue.enqueue(add, number, 1)
+        queue.enqueue(add, 0, 0, delay=60)
+
+        first = queue.claim('first', limit=2)
+        second = queue.claim('second', limit=5)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({job.pk for job in first}
+                         & {job.pk for job in second})
+        self.assertEqual(queue.claim('third', limit=5), [])
+        for job in first + second:
+            self.assertEqual(job.status, Job.RUNNING)
+            self.assertEqual(job.attempts, 1)
+
+    def test_retry_backoff_then_failed(self):
+        pk = queue.enqueue(fail).pk
+        for delay in (10, 20):
+            job, = queue.claim('worker')
+            self.run_failing(job)
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertAlmostEqual(seconds_from_now(job.run_at), delay,
+                                   delta=2)
+            self.assertEqual(job.error, 'ValueError: сбой')
+            Job.objects.filter(pk=pk).update(run_at=timezone.now())
+
+        job, = queue.claim('worker')
+        self.run_failing(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished)
+
+    def test_run_records_result(self):
+        queue.enqueue(add, 2, 3)
+        job, = queue.claim('worker')
+        self.assertTrue(queue.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(json.loads(job.result), 5)
+
+    def test_recover_only_silent_jobs(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        live, silent, exhausted = [queue.enqueue(add, 1, 1)
+                                   for _ in range(3)]
+        queue.claim('worker', limit=3)
+        Job.objects.update(started=long_ago, heartbeat=long_ago)
+        Job.objects.filter(pk=exhausted.pk).update(attempts=3)
+        # A live worker keeps reporting on its job, however long it runs.
+        self.assertEqual(queue.heartbeat('worker', [live.pk]), 1)
+        self.assertEqual(queue.heartbeat('other', [silent.pk]), 0)
+
+        self.assertEqual(queue.recover(600), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {live.pk: Job.RUNNING,
+                                    silent.pk: Job.QUEUED,
+                                    exhausted.pk: Job.FAILED})
+
+    def test_schedule_periodic(self):
+        schedule = {add.job_name: 60}
+        queue.schedule_periodic(schedule)
+        queue.schedule_periodic(schedule)
+        job, = Job.objects.filter(name=add.job_name)
+        self.assertAlmostEqual(seconds_from_now(job.run_at), 60, delta=2)
+
+        queue.claim('worker', limit=1)
+        Job.objects.update(run_at=timezone.now())
+        queue.claim('worker', limit=1)
+        queue.schedule_periodic(schedule)
+        self.assertEqual(Job.objects.filter(name=add.job_name).count(), 1)
+
+    def test_purge(self):
+        old = timezone.now() - timedelta(days=10)
+        for status, finished in ((Job.DONE, old), (Job.DONE, timezone.now()),
+                                 (Job.FAILED, old)):
+            Job.objects.create(name=add.job_name, status=status,
+                               finished=finished)
+
+        self.assertEqual(queue.purge(7), 1)
+        self.assertEqual(sorted(Job.objects.values_list('status', flat=True)),
+                         [Job.DONE, Job.FAILED])
+
+
+@mock.patch('signal.signal')
+class RunWorkerTests(TransactionTestCase):
+    def run_worker(self):
+        call_command('run_worker', once=True, threads=2, poll_interval=0.01,
+                     stdout=mock.Mock())
+
+    def test_once(self, signal):
+        added = queue.enqueue(add, 2, 3)
+        failed = queue.enqueue(fail)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.run_worker()
+
+        added.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(added.status, Job.DONE)
+        self.assertEqual(json.loads(added.result), 5)
+        self.assertEqual(failed.status, Job.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+
+    def test_survives_database_errors(self, signal):
+        job = queue.enqueue(add, 1, 1)
+        claim = queue.claim
+        with mock.patch.object(
+                queue, 'claim', side_effect=[
+                    OperationalError('server closed the connection'),
+                    OperationalError('server closed the connection'),
+                    claim('worker'), [], []]), self.assertLogs(
+                'jobs.management.commands.run_worker', 'ERROR') as logs:
+            self.run_worker()
+
+        self.assertEqual(len(logs.records), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
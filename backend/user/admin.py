@@ -4,7 +4,15 @@ from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
+    list_display = (
+        'username',
+        'email',
+        'recipes_count',
+        'followers_count',
+        'following_count',
+    )
     list_filter = ('email', 'username')
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
 
 
 admin.site.register(User, UserAdmin)
@@ -18,6 +18,12 @@ class User(AbstractUser):
     password = models.CharField(max_length=150)
     role = models.CharField(max_length=20, choices=ROLE,
                             default=GUEST_ROLE, blank=True)
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписок')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -22,3 +22,8 @@ class IsAuthorOrReadOnlyPermission(permissions.BasePermission):
 
         return (obj.author == request.user
                 or request.method in permissions.SAFE_METHODS)
+
+
+class IsAdminPermission(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_admin